@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+# Lower rank is served first; anything not listed shares DEFAULT_CATEGORY_RANK
+CATEGORY_RANK = {"Ambulance": 0, "AMBULANCE": 0}
+DEFAULT_CATEGORY_RANK = 1
+# Recent queue waits kept for the percentile metrics
+_WAIT_SAMPLES = 1000
+
+
+class AgentDispatcher:
+    """
+    Bounded priority queue in front of the proactive agent, drained by a
+    fixed number of worker tasks so a fleet-wide spike cannot launch
+    thousands of concurrent LLM graphs.
+
+    Jobs are ordered by vehicle category rank (ambulances first), then risk.
+    A vehicle has at most one pending job: a resubmit coalesces into it
+    (latest payload, highest risk), and submits for a vehicle whose agent is
+    already running are dropped. When the queue is full a new job replaces
+    the lowest-priority pending one, or is refused if it ranks below all of
+    them; a second, inverted heap finds that job without scanning. submit()
+    is synchronous and amortized O(log n), so it is safe on the tick path.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[Dict[str, Any]], Awaitable[Any]],
+        workers: int = 2,
+        max_queue: int = 200,
+        timeout: float = 180.0,
+        category_rank: Optional[Dict[str, int]] = None,
+    ):
+        self._run = run
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.category_rank = CATEGORY_RANK if category_rank is None else category_rank
+        self._heap: List[Tuple[int, float, int, str]] = []
+        # Negated keys: the lowest-priority pending job sits on top, for eviction
+        self._worst: List[Tuple[int, float, int, str]] = []
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._running: Set[str] = set()
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self.submitted = 0
+        self.coalesced = 0
+        self.deduped = 0
+        self.dropped = 0
+        self.shed = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+
+    def _key(self, job: Dict[str, Any]) -> Tuple[int, float]:
+        return self.category_rank.get(job["category"], DEFAULT_CATEGORY_RANK), -job["risk"]
+
+    def _worst_entry(self, job: Dict[str, Any]) -> Tuple[int, float, int, str]:
+        rank, neg_risk = self._key(job)
+        return -rank, -neg_risk, -job["seq"], job["vehicle_id"]
+
+    def _live(self, vehicle_id: str, seq: int) -> Optional[Dict[str, Any]]:
+        job = self._pending.get(vehicle_id)
+        return job if job is not None and job["seq"] == seq else None
+
+    def _push(self, job: Dict[str, Any]) -> None:
+        job["seq"] = next(self._seq)
+        heapq.heappush(self._heap, (*self._key(job), job["seq"], job["vehicle_id"]))
+        heapq.heappush(self._worst, self._worst_entry(job))
+        limit = 2 * self.max_queue + 16
+        if len(self._heap) > limit or len(self._worst) > limit:
+            # Shed / popped / re-prioritized jobs leave stale entries in both heaps; rebuild
+            self._heap = [(*self._key(j), j["seq"], vid) for vid, j in self._pending.items()]
+            self._worst = [self._worst_entry(j) for j in self._pending.values()]
+            heapq.heapify(self._heap)
+            heapq.heapify(self._worst)
+
+    def _peek_worst(self) -> Optional[Dict[str, Any]]:
+        while self._worst:
+            _, _, neg_seq, vehicle_id = self._worst[0]
+            job = self._live(vehicle_id, -neg_seq)
+            if job is not None:
+                return job
+            heapq.heappop(self._worst)
+        return None
+
+    def submit(self, vehicle_id: str, risk: float, category: Optional[str], payload: Any) -> str:
+        """Queue an agent run; returns "queued", "coalesced", "running" or "dropped"."""
+        self.submitted += 1
+        if vehicle_id in self._running:
+            self.deduped += 1
+            return "running"
+        job = self._pending.get(vehicle_id)
+        if job is not None:
+            self.coalesced += 1
+            job["payload"] = payload
+            if risk > job["risk"] or category != job["category"]:
+                job["risk"], job["category"] = max(risk, job["risk"]), category
+                self._push(job)  # the old heap entry goes stale
+            return "coalesced"
+
+        job = {"vehicle_id": vehicle_id, "risk": risk, "category": category, "payload": payload, "enqueued": time.monotonic()}
+        if len(self._pending) >= self.max_queue:
+            worst = self._peek_worst()
+            if self._key(job) >= self._key(worst):
+                self.dropped += 1
+                return "dropped"
+            del self._pending[worst["vehicle_id"]]
+            self.shed += 1
+        self._pending[vehicle_id] = job
+        self._push(job)
+        self._wake.set()
+        return "queued"
+
+    def _pop(self) -> Optional[Dict[str, Any]]:
+        while self._heap:
+            _, _, seq, vehicle_id = heapq.heappop(self._heap)
+            job = self._live(vehicle_id, seq)
+            if job is not None:
+                del self._pending[vehicle_id]
+                return job
+        return None
+
+    async def _worker(self) -> None:
+        while True:
+            job = self._pop()
+            if job is None:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            vehicle_id = job["vehicle_id"]
+            self._waits.append(time.monotonic() - job["enqueued"])
+            self._running.add(vehicle_id)
+            try:
+                await asyncio.wait_for(self._run(job), self.timeout)
+                self.completed += 1
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                print(f"[AgentDispatcher] agent for {vehicle_id} timed out after {self.timeout}s")
+            except Exception as e:
+                self.failed += 1
+                print(f"[AgentDispatcher] agent for {vehicle_id} failed: {e}")
+            finally:
+                self._running.discard(vehicle_id)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        now = time.monotonic()
+        oldest = min((j["enqueued"] for j in self._pending.values()), default=now)
+        return {
+            "workers": self.workers,
+            "queue_depth": len(self._pending),
+            "max_queue": self.max_queue,
+            "running": len(self._running),
+            "oldest_wait_ms": round((now - oldest) * 1000, 1),
+            "wait_ms_p50": round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1] * 1000, 1) if waits else 0.0,
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "deduped_running": self.deduped,
+            "dropped": self.dropped,
+            "shed": self.shed,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+        }
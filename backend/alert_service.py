@@ -1,32 +1,154 @@
-from typing import Dict, Any, List, Optional
+import heapq
+import time
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple
+
+# (severity, minimum risk score), most severe first
+SEVERITY_LEVELS: Tuple[Tuple[str, float], ...] = (("critical", 0.95), ("high", 0.0))
+# Fields whose change makes a refresh worth an "updated" event
+_EVENT_FIELDS = ("severity", "predicted_failure_type", "root_cause_sensor", "message")
+# Smallest risk movement reported as an update
+RISK_EVENT_DELTA = 0.02
+
+AlertListener = Callable[[str, Dict[str, Any]], None]
 
 
 class AlertTriggerService:
-    def __init__(self, threshold: float = 0.85):
+    """
+    Active alerts indexed by vehicle_id, with a secondary index per severity.
+
+    An alert is raised when risk reaches `threshold` and only cleared once
+    risk falls below `clear_threshold`, so scores hovering around the
+    threshold don't flap. Alerts that aren't refreshed within `ttl_seconds`
+    expire. Per-vehicle operations are O(1); expiry sweeps are O(log n) per alert.
+
+    Listeners are called with ("raised" | "updated" | "cleared", alert);
+    refreshes that change nothing visible don't produce an "updated" event.
+    """
+
+    def __init__(self, threshold: float = 0.85, clear_threshold: Optional[float] = None, ttl_seconds: float = 300.0):
         self.threshold = threshold
-        self.active_alerts: List[Dict[str, Any]] = []
+        self.clear_threshold = threshold - 0.1 if clear_threshold is None else clear_threshold
+        self.ttl_seconds = ttl_seconds
+        self.active_alerts: Dict[str, Dict[str, Any]] = {}
+        self._by_severity: Dict[str, Set[str]] = {name: set() for name, _ in SEVERITY_LEVELS}
+        # One (expires_at, vehicle_id, raised_at) entry per alert; refreshes
+        # only move expires_at on the alert and the entry is re-queued lazily
+        self._expiry: List[Tuple[float, str, float]] = []
+        self._listeners: List[AlertListener] = []
+        # Risk score as of the last raised/updated event, per vehicle
+        self._reported_risk: Dict[str, float] = {}
+
+    def add_listener(self, listener: AlertListener) -> None:
+        self._listeners.append(listener)
+
+    def _emit(self, kind: str, alert: Dict[str, Any]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(kind, alert)
+            except Exception as e:
+                print(f"[AlertTriggerService] listener failed: {e}")
+
+    @staticmethod
+    def severity_for(risk_score: float) -> str:
+        for name, floor in SEVERITY_LEVELS:
+            if risk_score >= floor:
+                return name
+        return SEVERITY_LEVELS[-1][0]
 
     def evaluate(self, model_output: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Evaluate a model output and store/return alert if over threshold."""
-        if model_output["risk_score"] >= self.threshold:
+        vid = model_output["vehicle_id"]
+        risk = model_output["risk_score"]
+        active = self.get_alert_for_vehicle(vid) is not None
+        if risk >= self.threshold or (active and risk >= self.clear_threshold):
             alert = {
-                "vehicle_id": model_output["vehicle_id"],
+                "vehicle_id": vid,
                 "predicted_failure_type": model_output["predicted_failure_type"],
                 "root_cause_sensor": model_output["root_cause_sensor"],
                 "current_sensor_value": model_output.get("current_sensor_value"),
-                "risk_score": model_output["risk_score"],
+                "risk_score": risk,
+                "severity": self.severity_for(risk),
             }
-            self._upsert_alert(alert)
-            return alert
+            return self._upsert_alert(alert)
+        if active:
+            self.clear_alert(vid)
         return None
 
-    def _upsert_alert(self, alert: Dict[str, Any]):
-        existing = self.get_alert_for_vehicle(alert["vehicle_id"])
-        if existing:
-            self.active_alerts = [a for a in self.active_alerts if a["vehicle_id"] != alert["vehicle_id"]]
-        self.active_alerts.append(alert)
+    def trigger_alert(self, vehicle_id: str, message: str, severity: str = "critical") -> Dict[str, Any]:
+        """Raise (or annotate the existing) alert for a vehicle outside the scoring path."""
+        existing = self.get_alert_for_vehicle(vehicle_id)
+        alert = {**existing} if existing else {"vehicle_id": vehicle_id, "severity": severity}
+        alert["message"] = message
+        return self._upsert_alert(alert)
+
+    def is_alert_active(self, vehicle_id: str) -> bool:
+        return self.get_alert_for_vehicle(vehicle_id) is not None
 
     def get_alert_for_vehicle(self, vehicle_id: str) -> Optional[Dict[str, Any]]:
-        return next((a for a in self.active_alerts if a["vehicle_id"] == vehicle_id), None)
+        alert = self.active_alerts.get(vehicle_id)
+        if alert is not None and alert["expires_at"] <= time.time():
+            self.clear_alert(vehicle_id, "expired")
+            return None
+        return alert
+
+    def clear_alert(self, vehicle_id: str, reason: str = "resolved") -> Optional[Dict[str, Any]]:
+        alert = self.active_alerts.pop(vehicle_id, None)
+        if alert is not None:
+            self._by_severity[alert["severity"]].discard(vehicle_id)
+            self._reported_risk.pop(vehicle_id, None)
+            self._emit("cleared", {**alert, "reason": reason})
+        return alert
+
+    def alerts_by_severity(self, severity: str) -> List[Dict[str, Any]]:
+        self.expire()
+        return [self.active_alerts[vid] for vid in self._by_severity.get(severity, ())]
+
+    def all_alerts(self) -> List[Dict[str, Any]]:
+        self.expire()
+        return list(self.active_alerts.values())
+
+    def counts(self) -> Dict[str, int]:
+        self.expire()
+        return {name: len(vids) for name, vids in self._by_severity.items()}
 
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """Drop alerts whose TTL has passed; returns the expired vehicle ids."""
+        now = time.time() if now is None else now
+        expired = []
+        while self._expiry and self._expiry[0][0] <= now:
+            _, vid, raised_at = heapq.heappop(self._expiry)
+            alert = self.active_alerts.get(vid)
+            if alert is None or alert["raised_at"] != raised_at:
+                continue  # cleared (and possibly re-raised) since this entry was queued
+            if alert["expires_at"] <= now:
+                self.clear_alert(vid, "expired")
+                expired.append(vid)
+            else:
+                heapq.heappush(self._expiry, (alert["expires_at"], vid, raised_at))
+        return expired
 
+    def _upsert_alert(self, alert: Dict[str, Any]) -> Dict[str, Any]:
+        vid = alert["vehicle_id"]
+        now = time.time()
+        existing = self.active_alerts.get(vid)
+        if existing is not None:
+            alert.setdefault("message", existing.get("message"))
+            alert["raised_at"] = existing["raised_at"]
+            if existing["severity"] != alert["severity"]:
+                self._by_severity[existing["severity"]].discard(vid)
+        else:
+            alert["raised_at"] = now
+        alert["updated_at"] = now
+        alert["expires_at"] = now + self.ttl_seconds
+        self.active_alerts[vid] = alert
+        self._by_severity.setdefault(alert["severity"], set()).add(vid)
+        risk = alert.get("risk_score", 0)
+        if existing is None:
+            heapq.heappush(self._expiry, (alert["expires_at"], vid, now))
+            self._reported_risk[vid] = risk
+            self._emit("raised", alert)
+        elif any(alert.get(k) != existing.get(k) for k in _EVENT_FIELDS) or \
+                abs(risk - self._reported_risk.get(vid, 0)) >= RISK_EVENT_DELTA:
+            self._reported_risk[vid] = risk
+            self._emit("updated", alert)
+        return alert
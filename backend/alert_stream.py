@@ -0,0 +1,98 @@
+import asyncio
+import json
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+# Events kept for resume-after-reconnect
+ALERT_EVENT_LOG = 10000
+# Per-client buffer; a client that falls further behind is told to resync
+ALERT_CLIENT_QUEUE = 256
+
+
+class AlertStreamClient:
+    """One stream consumer with an optional dealer / service-center filter."""
+
+    def __init__(self, dealer_id: Optional[str] = None, center_id: Optional[str] = None, maxsize: int = ALERT_CLIENT_QUEUE):
+        self.dealer_id = dealer_id
+        self.center_id = center_id
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.dealer_id and event.get("dealer_id") != self.dealer_id:
+            return False
+        if self.center_id and event.get("service_center_id") != self.center_id:
+            return False
+        return True
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        if self.lagged or not self.matches(event):
+            return
+        if self.queue.full():
+            # Rather than silently losing events, stop and let the client resume from its last id
+            self.lagged = True
+            return
+        self.queue.put_nowait(event)
+
+
+class AlertStream:
+    """
+    Sequenced alert events (raised / updated / cleared) fanned out to live
+    clients, with a bounded log so a reconnecting client can resume from the
+    last sequence number it saw.
+
+    `routing` maps vehicle_id -> {"dealer_id", "service_center_id"}; it is
+    stamped onto each event when published so filters are a dict compare.
+    """
+
+    def __init__(self, max_events: int = ALERT_EVENT_LOG):
+        self.seq = 0
+        self.routing: Dict[str, Dict[str, Optional[str]]] = {}
+        self._log: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self._clients: Set[AlertStreamClient] = set()
+
+    def publish(self, kind: str, alert: Dict[str, Any]) -> Dict[str, Any]:
+        """AlertTriggerService listener."""
+        self.seq += 1
+        route = self.routing.get(alert["vehicle_id"], {})
+        event = {
+            "seq": self.seq,
+            "event": kind,
+            "vehicle_id": alert["vehicle_id"],
+            "dealer_id": route.get("dealer_id"),
+            "service_center_id": route.get("service_center_id"),
+            "alert": alert,
+        }
+        self._log.append(event)
+        for client in self._clients:
+            client.offer(event)
+        return event
+
+    def since(self, seq: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Events after `seq`, or None if they can't be replayed: some have left
+        the log, or `seq` is ahead of us (issued before a server restart).
+        """
+        if seq > self.seq:
+            return None
+        if seq == self.seq:
+            return []
+        if not self._log or self._log[0]["seq"] > seq + 1:
+            return None
+        start = len(self._log) - (self.seq - seq)
+        return [self._log[i] for i in range(start, len(self._log))]
+
+    def connect(self, dealer_id: Optional[str] = None, center_id: Optional[str] = None) -> AlertStreamClient:
+        client = AlertStreamClient(dealer_id, center_id)
+        self._clients.add(client)
+        return client
+
+    def disconnect(self, client: AlertStreamClient) -> None:
+        self._clients.discard(client)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"seq": self.seq, "clients": len(self._clients), "logged_events": len(self._log)}
+
+
+def sse_message(event: Dict[str, Any], kind: Optional[str] = None) -> str:
+    return f"id: {event['seq']}\nevent: {kind or event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
@@ -0,0 +1,92 @@
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+def dealer_key(dealer_id: Any) -> str:
+    """Canonical cache key, so UUID objects and any string spelling of them collide."""
+    try:
+        return str(uuid.UUID(str(dealer_id)))
+    except ValueError:
+        return str(dealer_id)
+
+
+class DealerSnapshotCache:
+    """
+    LRU cache of serialized dealer snapshots (see robust_db._serialize_dealer).
+
+    Writers swap in a patched copy of the cached snapshot after their
+    transaction commits (write-through), so a write followed by a read costs
+    one small query instead of reloading the dealer's whole inventory.
+    Snapshots are never mutated once cached, so ones already handed out stay
+    stable. Thread-safe: robust_db functions run on the DB executor threads.
+    """
+
+    def __init__(self, max_dealers: int = 1024):
+        self.max_dealers = max_dealers
+        self._snapshots: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every write, so a miss that raced a write doesn't cache stale data
+        self._writes: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, dealer_id: Any, load: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        key = dealer_key(dealer_id)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                self._snapshots.move_to_end(key)
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+            writes = self._writes.get(key, 0)
+        snapshot = load()
+        if snapshot is not None:
+            self.put(snapshot, writes)
+        return snapshot
+
+    def put(self, snapshot: Dict[str, Any], writes: Optional[int] = None) -> None:
+        key = dealer_key(snapshot["dealer_id"])
+        with self._lock:
+            if writes is not None and self._writes.get(key, 0) != writes:
+                return
+            self._snapshots[key] = snapshot
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > self.max_dealers:
+                self._snapshots.popitem(last=False)
+
+    def _written(self, key: str) -> Optional[Dict[str, Any]]:
+        self._writes[key] = self._writes.get(key, 0) + 1
+        return self._snapshots.get(key)
+
+    def add_inventory(self, dealer_id: Any, *items: Dict[str, Any]) -> None:
+        key = dealer_key(dealer_id)
+        with self._lock:
+            snapshot = self._written(key)
+            if snapshot is not None:
+                self._snapshots[key] = {**snapshot, "inventory": snapshot["inventory"] + list(items)}
+
+    def mark_sold(self, dealer_id: Any, *sold: Dict[str, Any]) -> None:
+        """Move vehicles ({"chassis_number", ...} sold rows) from inventory to sold_vehicles."""
+        key = dealer_key(dealer_id)
+        with self._lock:
+            snapshot = self._written(key)
+            if snapshot is None:
+                return
+            chassis = {v["chassis_number"] for v in sold}
+            self._snapshots[key] = {
+                **snapshot,
+                "inventory": [v for v in snapshot["inventory"] if v["chassis_number"] not in chassis],
+                "sold_vehicles": [v for v in snapshot["sold_vehicles"] if v["chassis_number"] not in chassis] + list(sold),
+            }
+
+    def invalidate(self, dealer_id: Any) -> None:
+        with self._lock:
+            key = dealer_key(dealer_id)
+            self._written(key)
+            self._snapshots.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"dealers": len(self._snapshots), "max_dealers": self.max_dealers, "hits": self.hits, "misses": self.misses}
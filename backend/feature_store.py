@@ -0,0 +1,132 @@
+from typing import Dict, Any, Optional, Sequence
+
+import numpy as np
+
+from history_store import _sample_time
+from predictive import SENSOR_NAMES, fill_telemetry_row
+
+
+class _VehicleFeatureState:
+    """Preallocated per-sensor rolling statistics for one vehicle."""
+
+    __slots__ = ("count", "last_ts", "anomaly", "x", "ewma", "var", "slope", "rate", "last", "delta", "sq", "bound", "hits")
+
+    def __init__(self, width: int):
+        self.count = 0
+        self.last_ts = 0.0
+        self.anomaly = False
+        self.x = np.zeros(width)
+        self.ewma = np.zeros(width)
+        self.var = np.zeros(width)
+        self.slope = np.zeros(width)
+        self.rate = np.zeros(width)
+        self.last = np.zeros(width)
+        # Scratch buffers reused on every update
+        self.delta = np.zeros(width)
+        self.sq = np.zeros(width)
+        self.bound = np.zeros(width)
+        self.hits = np.zeros(width, dtype=bool)
+
+
+class VehicleFeatureStore:
+    """
+    Incremental per-vehicle feature state: EWMA, exponentially weighted
+    variance, trend slope (units/s) and rate of change for every sensor.
+    Each update is O(sensors), independent of history length, and writes
+    into buffers allocated when the vehicle is first seen.
+    """
+
+    def __init__(self, alpha: float = 0.2, slope_alpha: float = 0.1, z_threshold: float = 4.0, warmup: int = 10):
+        self.alpha = alpha
+        self.slope_alpha = slope_alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.sensors: Sequence[str] = SENSOR_NAMES
+        self._index = {s: j for j, s in enumerate(self.sensors)}
+        self._states: Dict[str, _VehicleFeatureState] = {}
+
+    def update(self, vehicle_id: str, telemetry: Dict[str, Any], ts: Optional[float] = None) -> _VehicleFeatureState:
+        """
+        Fold one sample into the vehicle's state and refresh its anomaly flag.
+        `ts` defaults to the sample's own timestamp, so a batch of backfilled
+        samples keeps its real spacing.
+        """
+        ts = _sample_time(telemetry) if ts is None else ts
+        st = self._states.get(vehicle_id)
+        if st is None:
+            st = self._states[vehicle_id] = _VehicleFeatureState(len(self.sensors))
+        fill_telemetry_row(telemetry, st.x)
+
+        if st.count == 0:
+            st.ewma[:] = st.x
+            st.last[:] = st.x
+            st.count = 1
+            st.last_ts = ts
+            st.anomaly = False
+            return st
+
+        a = self.alpha
+        np.subtract(st.x, st.ewma, out=st.delta)
+        np.multiply(st.delta, st.delta, out=st.sq)
+
+        # Deviation test against the variance *before* this sample is folded in
+        np.multiply(st.var, self.z_threshold * self.z_threshold, out=st.bound)
+        np.greater(st.sq, st.bound, out=st.hits)
+        st.anomaly = st.count >= self.warmup and bool(st.hits.any())
+
+        # ewma += a * delta ; var = (1 - a) * (var + a * delta^2)
+        np.multiply(st.delta, a, out=st.bound)
+        np.add(st.ewma, st.bound, out=st.ewma)
+        np.multiply(st.sq, a, out=st.sq)
+        np.add(st.var, st.sq, out=st.var)
+        np.multiply(st.var, 1 - a, out=st.var)
+
+        # rate = (x - last) / dt ; slope = EWMA of rate. A sample that is not
+        # newer than the last one (duplicate or out of order) has no usable dt.
+        dt = ts - st.last_ts
+        if dt > 0:
+            np.subtract(st.x, st.last, out=st.rate)
+            np.divide(st.rate, dt, out=st.rate)
+            np.subtract(st.rate, st.slope, out=st.bound)
+            np.multiply(st.bound, self.slope_alpha, out=st.bound)
+            np.add(st.slope, st.bound, out=st.slope)
+            st.last[:] = st.x
+            st.last_ts = ts
+        st.count += 1
+        return st
+
+    def is_anomalous(self, vehicle_id: str) -> bool:
+        st = self._states.get(vehicle_id)
+        return bool(st and st.anomaly)
+
+    def projected_values(self, vehicle_id: str, horizon_s: float = 0.0, sensors: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """
+        Smoothed (EWMA) sensor values, optionally extrapolated `horizon_s`
+        seconds along the trend slope. Suitable for predict_breakdown_risk(_batch)(features=...).
+        """
+        st = self._states.get(vehicle_id)
+        if st is None:
+            return {}
+        out = {}
+        for s in sensors or self.sensors:
+            j = self._index[s]
+            out[s] = float(st.ewma[j] + st.slope[j] * horizon_s)
+        return out
+
+    def snapshot(self, vehicle_id: str, sensors: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, float]]:
+        st = self._states.get(vehicle_id)
+        if st is None:
+            return {}
+        out = {}
+        for s in sensors or self.sensors:
+            j = self._index[s]
+            out[s] = {
+                "ewma": float(st.ewma[j]),
+                "variance": float(st.var[j]),
+                "slope_per_s": float(st.slope[j]),
+                "rate_of_change": float(st.rate[j]),
+            }
+        return out
+
+    def drop(self, vehicle_id: str) -> None:
+        self._states.pop(vehicle_id, None)
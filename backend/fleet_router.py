@@ -0,0 +1,110 @@
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from service_locator import ServiceCenterIndex
+from wait_estimator import WaitTimeEstimator
+
+# Candidate centers considered per vehicle before falling back to the full catalog
+CANDIDATES_PER_VEHICLE = 8
+# Minutes of queueing treated as equivalent to one km of travel
+WAIT_MINUTES_PER_KM = 1.0
+# Default max open tickets per center when the catalog entry has no "capacity"
+DEFAULT_CENTER_CAPACITY = 50
+
+
+def route_fleet(
+    vehicles: Sequence[Dict[str, Any]],
+    index: ServiceCenterIndex,
+    estimator: WaitTimeEstimator,
+    candidates: int = CANDIDATES_PER_VEHICLE,
+    wait_minutes_per_km: float = WAIT_MINUTES_PER_KM,
+    default_capacity: int = DEFAULT_CENTER_CAPACITY,
+) -> Dict[str, Any]:
+    """
+    Assign vehicles ({"vehicle_id", "lat", "lon"}) to service centers.
+
+    Cost = distance_km + projected wait / `wait_minutes_per_km`, where the
+    projected wait includes vehicles already placed in this batch, subject
+    to each center's remaining capacity. Vehicles are placed greedily in
+    order of regret (how much worse their second choice is), so vehicles
+    with one good option get it before flexible ones fill it.
+    """
+    centers = index.centers
+    if not vehicles or not centers:
+        return {"assignments": [], "unassigned": [v["vehicle_id"] for v in vehicles], "center_load": {}}
+
+    n = len(centers)
+    ids = [c["id"] for c in centers]
+    open_now = np.array([estimator.open_tickets(cid) for cid in ids], dtype=float)
+    per_ticket = np.array([estimator.minutes_per_ticket(cid) for cid in ids]) / wait_minutes_per_km
+    remaining = np.array([c.get("capacity", default_capacity) for c in centers], dtype=float) - open_now
+    added = np.zeros(n)
+
+    lats = [v["lat"] for v in vehicles]
+    lons = [v["lon"] for v in vehicles]
+    cand_idx, cand_dist = index.nearest_batch(lats, lons, candidates)
+    # Cost of each candidate against current queues, before this batch
+    base_cost = cand_dist + (open_now[cand_idx] + 1) * per_ticket[cand_idx]
+    sorted_cost = np.sort(base_cost, axis=1)
+    regret = sorted_cost[:, 1] - sorted_cost[:, 0] if sorted_cost.shape[1] > 1 else np.zeros(len(vehicles))
+    order = np.argsort(-regret, kind="stable")
+
+    assignment = np.full(len(vehicles), -1, dtype=np.intp)
+    distance = np.zeros(len(vehicles))
+    overflow: List[int] = []
+    for v in order:
+        row_idx, row_dist = cand_idx[v], cand_dist[v]
+        cost = row_dist + (open_now[row_idx] + added[row_idx] + 1) * per_ticket[row_idx]
+        cost[remaining[row_idx] - added[row_idx] < 1] = np.inf
+        best = int(np.argmin(cost))
+        if np.isinf(cost[best]):
+            overflow.append(v)
+            continue
+        c = row_idx[best]
+        assignment[v], distance[v] = c, row_dist[best]
+        added[c] += 1
+
+    if overflow:
+        # Nearby centers were full; widen to the whole catalog
+        dist = index.distance_matrix([lats[v] for v in overflow], [lons[v] for v in overflow])
+        for row, v in enumerate(overflow):
+            cost = dist[row] + (open_now + added + 1) * per_ticket
+            cost[remaining - added < 1] = np.inf
+            c = int(np.argmin(cost))
+            if np.isinf(cost[c]):
+                continue
+            assignment[v], distance[v] = c, dist[row, c]
+            added[c] += 1
+
+    assignments, unassigned = [], []
+    queue_pos = open_now.copy()
+    for v in range(len(vehicles)):
+        c = assignment[v]
+        if c < 0:
+            unassigned.append(vehicles[v]["vehicle_id"])
+            continue
+        assignments.append({
+            "vehicle_id": vehicles[v]["vehicle_id"],
+            "center_id": ids[c],
+            "center_name": centers[c]["name"],
+            "distance_km": round(float(distance[v]), 2),
+            "estimated_wait_time_minutes": int(round(queue_pos[c] * per_ticket[c] * wait_minutes_per_km)),
+        })
+        queue_pos[c] += 1
+    center_load = {
+        ids[c]: {"assigned": int(added[c]), "open_tickets": int(open_now[c]), "capacity_left": int(remaining[c] - added[c])}
+        for c in np.flatnonzero(added)
+    }
+    return {"assignments": assignments, "unassigned": unassigned, "center_load": center_load}
+
+
+def locate_vehicles(vehicle_ids: Sequence[str], latest: Any) -> List[Dict[str, Any]]:
+    """Vehicles with a known last position, via `latest(vehicle_id) -> sample dict`."""
+    located = []
+    for vid in vehicle_ids:
+        sample = latest(vid)
+        lat, lon = sample.get("latitude"), sample.get("longitude")
+        if lat is not None and lon is not None:
+            located.append({"vehicle_id": vid, "lat": float(lat), "lon": float(lon)})
+    return located
@@ -0,0 +1,201 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from predictive import _get_val
+
+
+def _numeric(value: Any) -> Optional[float]:
+    """Column value for a telemetry field, or None if it belongs in the tag dict."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, dict) and "sensor_1" in value:
+        return _get_val(value)
+    return None
+
+
+def _sample_time(sample: Dict[str, Any]) -> float:
+    """Epoch seconds of the sample's own `timestamp` (naive ISO is UTC); now if it has none."""
+    value = sample.get("timestamp")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value / 1000 if abs(value) > 1e11 else float(value)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return time.time()
+        return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+    return time.time()
+
+
+class _VehicleRing:
+    """
+    Fixed-capacity columnar ring buffer for one vehicle.
+
+    Every row is written twice (at i and i + capacity) so the newest `size`
+    rows are always one contiguous slice and windows can be returned as views.
+    """
+
+    __slots__ = ("capacity", "size", "head", "ts", "cols", "tags")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self.head = 0
+        self.ts = np.zeros(2 * capacity)
+        self.cols: Dict[str, np.ndarray] = {}
+        self.tags: Dict[str, Any] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return self.ts.nbytes * (1 + len(self.cols))
+
+    def bounds(self) -> Tuple[int, int]:
+        end = self.head + self.capacity
+        return end - self.size, end
+
+
+class TelemetryHistoryStore:
+    """
+    Per-vehicle telemetry history backed by preallocated NumPy columns.
+
+    Numeric fields (and V3 redundant sensor dicts, stored as their mean) go
+    into one float column each; everything else only keeps its latest value.
+    Rows are stamped with the sample's own `timestamp`, so `since` filters on
+    telemetry time rather than arrival time.
+    Appends are O(fields), window reads return views, and the least recently
+    updated vehicles are evicted once `max_bytes` is exceeded; evict
+    listeners are told so per-vehicle state kept elsewhere can go with them.
+    """
+
+    def __init__(self, capacity: int = 300, max_bytes: int = 256 * 1024 * 1024):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self._rings: "OrderedDict[str, _VehicleRing]" = OrderedDict()
+        self._bytes = 0
+        self._evict_listeners: List[Callable[[str], None]] = []
+
+    def add_evict_listener(self, fn: Callable[[str], None]) -> None:
+        """fn(vehicle_id) is called whenever a vehicle's history is dropped."""
+        self._evict_listeners.append(fn)
+
+    def __contains__(self, vehicle_id: str) -> bool:
+        return vehicle_id in self._rings
+
+    def __len__(self) -> int:
+        return len(self._rings)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._bytes
+
+    def vehicle_ids(self) -> List[str]:
+        return list(self._rings.keys())
+
+    def append(self, vehicle_id: str, sample: Dict[str, Any], ts: Optional[float] = None) -> None:
+        ts = _sample_time(sample) if ts is None else ts
+        ring = self._rings.get(vehicle_id)
+        if ring is None:
+            ring = self._rings[vehicle_id] = _VehicleRing(self.capacity)
+            self._reserve(ring.ts.nbytes, vehicle_id)
+        else:
+            self._rings.move_to_end(vehicle_id)
+
+        i, cap = ring.head, ring.capacity
+        ring.ts[i] = ring.ts[i + cap] = ts
+        seen = 0
+        tags = {}
+        for key, value in sample.items():
+            num = _numeric(value)
+            if num is None:
+                if value is None and key in ring.cols:
+                    num = np.nan  # explicit null: the column must not keep the previous reading
+                else:
+                    tags[key] = value
+                    continue
+            col = ring.cols.get(key)
+            if col is None:
+                col = ring.cols[key] = np.full(2 * cap, np.nan)
+                self._reserve(col.nbytes, vehicle_id)
+            col[i] = col[i + cap] = num
+            seen += 1
+        # Tags are the latest sample's only; a field it dropped must not linger
+        ring.tags = tags
+        if seen != len(ring.cols):
+            # Fields missing from this sample must not show a stale value
+            for key, col in ring.cols.items():
+                if key not in sample:
+                    col[i] = col[i + cap] = np.nan
+
+        ring.head = (i + 1) % cap
+        ring.size = min(ring.size + 1, cap)
+
+    def latest(self, vehicle_id: str) -> Dict[str, Any]:
+        """Most recent sample as a flat dict ({} if the vehicle is unknown)."""
+        ring = self._rings.get(vehicle_id)
+        if ring is None or ring.size == 0:
+            return {}
+        last = ring.head + ring.capacity - 1
+        out = dict(ring.tags)
+        for key, col in ring.cols.items():
+            v = col[last]
+            if v == v:  # skip NaN
+                out[key] = float(v)
+        return out
+
+    def window(
+        self,
+        vehicle_id: str,
+        since: Optional[float] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Timestamps and field columns newer than `since` (epoch seconds).
+        All arrays are read-only views into the ring; copy before holding on
+        to them across appends. If samples arrived out of timestamp order the
+        `since` filter falls back to a mask and returns copies instead.
+        """
+        ring = self._rings.get(vehicle_id)
+        if ring is None:
+            return np.empty(0), {}
+        start, end = ring.bounds()
+        names = ring.cols.keys() if fields is None else [f for f in fields if f in ring.cols]
+        mask = None
+        if since is not None:
+            ts_all = ring.ts[start:end]
+            if len(ts_all) < 2 or bool(np.all(ts_all[1:] >= ts_all[:-1])):
+                start += int(np.searchsorted(ts_all, since, side="right"))
+            else:
+                mask = ts_all > since
+        ts_view = ring.ts[start:end] if mask is None else ring.ts[start:end][mask]
+        ts_view.flags.writeable = False
+        cols = {}
+        for name in names:
+            view = ring.cols[name][start:end] if mask is None else ring.cols[name][start:end][mask]
+            view.flags.writeable = False
+            cols[name] = view
+        return ts_view, cols
+
+    def drop(self, vehicle_id: str) -> None:
+        ring = self._rings.pop(vehicle_id, None)
+        if ring is None:
+            return
+        self._bytes -= ring.nbytes
+        for fn in self._evict_listeners:
+            try:
+                fn(vehicle_id)
+            except Exception as e:
+                print(f"[HistoryStore] evict listener failed for {vehicle_id}: {e}")
+
+    def _reserve(self, nbytes: int, owner: str) -> None:
+        self._bytes += nbytes
+        while self._bytes > self.max_bytes and len(self._rings) > 1:
+            oldest = next(iter(self._rings))
+            if oldest == owner:
+                break
+            self.drop(oldest)
@@ -1,6 +1,7 @@
 import operator
-import psycopg2
 import json
+import re
+from contextlib import contextmanager
 from typing import Annotated, List, Literal, TypedDict, Union
 
 from langchain_ollama import ChatOllama
@@ -14,7 +15,8 @@ from pydantic import BaseModel
 from dotenv import load_dotenv
 
 import uuid 
-from robust_db import record_service_booking
+from database import engine
+from robust_db import open_appointment_slots, reserve_appointment
 
 load_dotenv()
 
@@ -25,27 +27,44 @@ llm_supervisor = ChatOllama(model="qwen2.5:7b", temperature=0, base_url="http://
 llm_worker = ChatOllama(model="qwen2.5:7b", temperature=0, base_url="http://localhost:11434")
 
 # --- POSTGRES CONNECTION ---
-DB_CONFIG = {
-    "dbname": "fleet_management_v3", 
-    "user": "postgres",
-    "password": "Prerita#12", 
-    "host": "localhost"
-}
-
-def query_pg(query, args=(), one=False):
-    """Helper for Postgres Tools"""
+# Tools borrow DBAPI connections from database.engine's pool (same URL, pool
+# limits and statement timeout as the rest of the backend) instead of
+# opening a new connection per call.
+@contextmanager
+def pg_cursor():
+    conn = engine.raw_connection()
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
         cur = conn.cursor()
-        cur.execute(query, args)
-        if query.strip().upper().startswith("SELECT"):
-            cols = [desc[0] for desc in cur.description]
-            rv = [dict(zip(cols, row)) for row in cur.fetchall()]
-            conn.close()
-            return (rv[0] if rv else None) if one else rv
-        else:
-            conn.commit()
-            conn.close()
+        yield conn, cur
+        conn.commit()
+    finally:
+        conn.close()  # back to the pool (rolled back if still in a transaction)
+
+def _numbered_params(query):
+    counter = iter(range(1, 1000))
+    return re.sub(r"%s", lambda _: f"${next(counter)}", query)
+
+def query_pg(query, args=(), one=False, name=None):
+    """
+    Helper for Postgres Tools. With `name`, the statement is PREPAREd once per
+    pooled connection and EXECUTEd on later calls, so repeated tool calls skip
+    parsing and planning.
+    """
+    try:
+        with pg_cursor() as (conn, cur):
+            if name:
+                prepared = conn.info.setdefault("prepared_statements", set())
+                if name not in prepared:
+                    cur.execute(f"PREPARE {name} AS {_numbered_params(query)}")
+                    prepared.add(name)
+                placeholders = f"({', '.join(['%s'] * len(args))})" if args else ""
+                cur.execute(f"EXECUTE {name}{placeholders}", args)
+            else:
+                cur.execute(query, args)
+            if query.strip().upper().startswith("SELECT"):
+                cols = [desc[0] for desc in cur.description]
+                rv = [dict(zip(cols, row)) for row in cur.fetchall()]
+                return (rv[0] if rv else None) if one else rv
             return True
     except Exception as e:
         return str(e)
@@ -69,24 +88,19 @@ def analyze_fleet_trends(scope: str = "all"):
     Analyzes the ENTIRE fleet to forecast service center demand and workload.
     """
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
         # 1. Get Fleet Health Distribution
-        cursor.execute("SELECT is_active, COUNT(*) FROM vehicles GROUP BY is_active")
-        status_raw = cursor.fetchall()
-        status_dist = {("Active" if row[0] else "Inactive"): row[1] for row in status_raw}
+        status_raw = query_pg("SELECT is_active, COUNT(*) AS n FROM vehicles GROUP BY is_active", name="fleet_status")
+        if isinstance(status_raw, str): raise RuntimeError(status_raw)
+        status_dist = {("Active" if row["is_active"] else "Inactive"): row["n"] for row in status_raw}
 
         # 2. Identify High-Risk Vehicles (Older than 2022)
-        cursor.execute("SELECT chassis_number, model FROM vehicles WHERE manufacturing_year < 2022")
-        high_risk_cars = cursor.fetchall()
+        high_risk_cars = query_pg("SELECT chassis_number, model FROM vehicles WHERE manufacturing_year < 2022", name="fleet_high_risk")
+        if isinstance(high_risk_cars, str): raise RuntimeError(high_risk_cars)
         
         demand_count = len(high_risk_cars)
         estimated_hours = demand_count * 3 
         avg_odometer = 45000 
 
-        conn.close()
-
         return f"""
         📊 FLEET FORECAST REPORT
         ------------------------
@@ -103,7 +117,7 @@ def analyze_fleet_trends(scope: str = "all"):
 @tool
 def get_maintenance_history(vehicle_id: str):
     """Fetches historical service records (SQL) for a vehicle."""
-    rows = query_pg("SELECT * FROM maintenance_history WHERE chassis_number = %s ORDER BY service_date DESC LIMIT 5", (vehicle_id,))
+    rows = query_pg("SELECT * FROM maintenance_history WHERE chassis_number = %s ORDER BY service_date DESC LIMIT 5", (vehicle_id,), name="maintenance_history")
     if not rows or isinstance(rows, str): return "No maintenance history found."
     return "\n".join([f"- {row['service_date']}: {row['service_type']} ({row['description']})" for row in rows])
 
@@ -127,7 +141,7 @@ def diagnose_issue(error_code: str, engine_temp: int):
 @tool
 def get_rca_insights(diagnosis: str):
     """Queries Manufacturing CAPA database for recurring defects."""
-    rows = query_pg("SELECT * FROM capa_records")
+    rows = query_pg("SELECT * FROM capa_records", name="capa_records")
     if not rows or isinstance(rows, str): return "No CAPA records found."
     
     matches = []
@@ -138,12 +152,30 @@ def get_rca_insights(diagnosis: str):
     if matches: return " ".join(matches)
     return "No recurring manufacturing defects found in CAPA DB."
 
+def _resolve_center(service_center_name: str):
+    return next((c for c in SERVICE_CENTERS if c["name"].lower() in service_center_name.lower()), None)
+
+def _normalize_slot(slot: str):
+    """'9', '9am', '2 pm', '14:00' -> 'HH:MM' (the appointments.slot_time format)."""
+    match = re.search(r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", slot.lower())
+    if not match: return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem == "pm" and hour < 12: hour += 12
+    if meridiem == "am" and hour == 12: hour = 0
+    return f"{hour:02d}:{minute:02d}"
+
 @tool
-def check_schedule_availability():
-    """Checks open slots in Postgres."""
-    rows = query_pg("SELECT slot_time FROM appointments WHERE is_booked = FALSE LIMIT 4")
-    if not rows or isinstance(rows, str): return "No slots available in the system."
-    return f"OPEN SLOTS: {[r['slot_time'] for r in rows]}"
+def check_schedule_availability(service_center_name: str = ""):
+    """Checks open slots in Postgres, optionally for one service center."""
+    center = _resolve_center(service_center_name) if service_center_name else None
+    try:
+        rows = open_appointment_slots(center["id"] if center else None)
+    except Exception as e:
+        return f"Error checking slots: {e}"
+    if not rows: return "No slots available in the system."
+    names = {c["id"]: c["name"] for c in SERVICE_CENTERS}
+    slots = [f"{names.get(r['center_id'], r['center_id'])} {r['slot_time']}" for r in rows]
+    return f"OPEN SLOTS: {slots}"
 
 @tool
 def book_appointment(slot: str, vehicle_id: str, service_center_name: str, issue_summary: str = "Routine Maintenance"):
@@ -153,41 +185,37 @@ def book_appointment(slot: str, vehicle_id: str, service_center_name: str, issue
     Do not say no or you don't have this feature, just keep going and collect data.
     """
     # 1. Resolve Service Center
-    selected_center = next((c for c in SERVICE_CENTERS if c["name"].lower() in service_center_name.lower()), None)
+    selected_center = _resolve_center(service_center_name)
     
     if not selected_center:
         return f"Error: '{service_center_name}' is not a valid center. Ask user to choose from: {CENTER_NAMES}."
 
     # 2. Standardize Slot Time
-    clean_slot = slot.lower().replace("am", "").replace("pm", "").strip()
-    if len(clean_slot) <= 2: clean_slot = f"{int(clean_slot):02d}:00"
-    
-    # 3. Check Availability
-    existing = query_pg("SELECT appt_id, slot_time FROM appointments WHERE slot_time LIKE %s AND is_booked = FALSE", (f"%{clean_slot}%",), one=True)
-    if not existing: return "Slot unavailable. Please pick another time."
-    
-    # 4. Mark Appointment as Booked
-    query_pg("UPDATE appointments SET is_booked = TRUE, booked_chassis = %s WHERE appt_id = %s", (vehicle_id, existing['appt_id']))
+    clean_slot = _normalize_slot(slot)
+    if not clean_slot: return "Slot unavailable. Please pick another time."
     
-    # 5. Create Full Service Ticket
+    # 3. Reserve the slot and create the service ticket in one transaction
     ticket_id = f"AI-SRV-{uuid.uuid4().hex[:6].upper()}"
-    
-    record_service_booking(
-        ticket_id=ticket_id,
-        chassis=vehicle_id,
-        owner_name="AI Booking",
-        issue=issue_summary,
-        center_id=selected_center["id"],    # [FIX] Dynamic ID
-        center_name=selected_center["name"] # [FIX] Dynamic Name
-    )
+    try:
+        reserved = reserve_appointment(
+            ticket_id=ticket_id,
+            chassis=vehicle_id,
+            issue=issue_summary,
+            center_id=selected_center["id"],    # [FIX] Dynamic ID
+            center_name=selected_center["name"], # [FIX] Dynamic Name
+            slot_time=clean_slot,
+        )
+    except Exception as e:
+        return f"Error booking appointment: {e}"
+    if not reserved: return "Slot unavailable. Please pick another time."
 
-    return f"BOOKING CONFIRMED: Ticket {ticket_id} generated for {vehicle_id} at {selected_center['name']} ({existing['slot_time']})."
+    return f"BOOKING CONFIRMED: Ticket {ticket_id} generated for {vehicle_id} at {selected_center['name']} ({reserved['slot_time']})."
 
 @tool
 def update_vehicle_status(vehicle_id: str, status: str):
     """Updates the active status of a vehicle in the database."""
     is_active = True if status.lower() == "active" else False
-    query_pg("UPDATE vehicles SET is_active = %s WHERE chassis_number = %s", (is_active, vehicle_id))
+    query_pg("UPDATE vehicles SET is_active = %s WHERE chassis_number = %s", (is_active, vehicle_id), name="vehicle_status")
     return f"Status for {vehicle_id} updated to {status}."
 
 @tool
@@ -1,10 +1,16 @@
 import asyncio
+import csv
+import io
 import json
+import os
 import random
-from datetime import datetime
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from langchain_core.messages import HumanMessage
 
@@ -13,20 +19,39 @@ from langchain_core.messages import HumanMessage
 # --- DATABASE & AUTH ---
 from robust_db import (
     add_stock,
+    add_booking_listener,
+    add_stock_bulk,
     assign_vehicle,
-    authenticate_dealer,
-    authenticate_owner,
+    assign_vehicles_bulk,
     get_dealer_snapshot,
+    get_login_record,
+    get_owner_profile,
     list_service_bookings,
+    db_stats,
     record_service_booking,
+    run_db,
+    service_center_load,
+    update_booking_status,
+    vehicle_alert_routing,
 )
 
 # --- INTELLIGENCE MODULES ---
-from predictive import predict_breakdown_risk
+from predictive import ScoringProfile, get_scoring_profile, predict_breakdown_risk_batch
 from ueba_engine import analyze as ueba_analyze
+from agent_dispatcher import AgentDispatcher
 from alert_service import AlertTriggerService
+from alert_stream import AlertStream, sse_message
+from feature_store import VehicleFeatureStore
+from history_store import TelemetryHistoryStore
+from service_locator import ServiceCenterIndex
+from fleet_router import locate_vehicles, route_fleet
+from wait_estimator import BOOKING_STATUSES, WaitTimeEstimator
+from telemetry_hub import BACKPRESSURE_POLICIES, MAX_CADENCE_S, CompactEncoder, TelemetryHub
+from telemetry_writer import TelemetryWriter
+from telemetry_storage import maintenance_loop as telemetry_maintenance_loop, query_history
+from telemetry_ingest import MAX_BATCH_SAMPLES, MAX_REPORTED_ERRORS, NDJSON_CHUNK_SAMPLES, iter_ndjson_chunks, split_valid
 from request_security import RequestSecurityMiddleware
-from access_control import apply_access_control
+from session_auth import PASSWORD_MAX_PENDING, PASSWORD_WORKERS, SESSION_TTL_SECONDS, LoginThrottled, PasswordVerifier, SessionTokens
 
 from llm_engine import app as agent_app 
 
@@ -40,9 +65,30 @@ app.add_middleware(RequestSecurityMiddleware, log_store=SECURITY_LOGS)
 
 # --- GLOBAL STATE ---
 ATTACK_MODE = False
-alert_service = AlertTriggerService()
-VEHICLE_HEALTH_HISTORY: Dict[str, List[Dict[str, Any]]] = {}
+alert_service = AlertTriggerService(
+    threshold=float(os.getenv("ALERT_RISK_THRESHOLD", "0.85")),
+    clear_threshold=float(os.getenv("ALERT_CLEAR_THRESHOLD", "0.75")),
+    ttl_seconds=float(os.getenv("ALERT_TTL_SECONDS", "300")),
+)
+alert_stream = AlertStream()
+alert_service.add_listener(alert_stream.publish)
+ALERT_ROUTING_REFRESH_SECONDS = float(os.getenv("ALERT_ROUTING_REFRESH_SECONDS", "300"))
+feature_store = VehicleFeatureStore()
+telemetry_writer = TelemetryWriter.from_env()
+VEHICLE_HEALTH_HISTORY = TelemetryHistoryStore(
+    capacity=int(os.getenv("HISTORY_CAPACITY", "300")),
+    max_bytes=int(os.getenv("HISTORY_MAX_BYTES", str(256 * 1024 * 1024))),
+)
 UEBA_CACHE: Dict[str, Dict[str, Any]] = {}
+VEHICLE_PROFILES: Dict[str, ScoringProfile] = {}
+
+def _forget_vehicle(vid: str) -> None:
+    """Per-vehicle state follows the history store's LRU eviction, so none of it grows unbounded."""
+    feature_store.drop(vid)
+    UEBA_CACHE.pop(vid, None)
+
+VEHICLE_HEALTH_HISTORY.add_evict_listener(_forget_vehicle)
+BACKGROUND_TASKS: List[asyncio.Task] = []
 
 # --- SERVICE CENTER DATA (KEPT ORIGINAL) ---
 SERVICE_CENTERS = [
@@ -73,6 +119,16 @@ class AssignRequest(BaseModel):
 class ServiceCenterRequest(BaseModel):
     location_lat: float
     location_lon: float
+    k: Optional[int] = None
+    radius_km: Optional[float] = None
+
+class GeoPoint(BaseModel):
+    lat: float
+    lon: float
+
+class BatchServiceCenterRequest(BaseModel):
+    locations: List[GeoPoint]
+    k: int = 3
 
 class ServiceRequest(BaseModel):
     chassis_number: str
@@ -83,30 +139,46 @@ class ServiceRequest(BaseModel):
     location_lon: Optional[float] = None
     center_id: Optional[str] = None
 
+class FleetVehicle(BaseModel):
+    vehicle_id: str
+    lat: float
+    lon: float
+
+class FleetRouteRequest(BaseModel):
+    vehicles: List[FleetVehicle] = []
+    from_alerts: bool = False
+    candidates: int = 8
+
+class BookingStatusRequest(BaseModel):
+    status: str
+
 class ChatbotQuery(BaseModel):
     chassis_number: str
     question: str
 
-# --- HELPER: SERVICE CENTER DISCOVERY (KEPT ORIGINAL) ---
-def _haversine(lat1, lon1, lat2, lon2):
-    from math import radians, sin, cos, sqrt, atan2
-    R = 6371  # km
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
-
-def get_nearest_service_centers(location_lat: float, location_lon: float):
-    centers = []
-    for c in SERVICE_CENTERS:
-        dist = _haversine(location_lat, location_lon, c["lat"], c["lon"])
-        centers.append({
-            **c,
-            "distance_km": round(dist, 2),
-            "estimated_wait_time_minutes": random.randint(20, 90),
-        })
-    return sorted(centers, key=lambda x: x["distance_km"])
+# --- HELPER: SERVICE CENTER DISCOVERY ---
+SERVICE_CENTER_INDEX = ServiceCenterIndex(SERVICE_CENTERS)
+wait_estimator = WaitTimeEstimator(
+    service_minutes=float(os.getenv("SERVICE_MINUTES_PER_JOB", "45")),
+    bays=int(os.getenv("SERVICE_BAYS_PER_CENTER", "2")),
+)
+WAIT_RECONCILE_SECONDS = float(os.getenv("WAIT_RECONCILE_SECONDS", "600"))
+
+def _center_result(center: Dict[str, Any], dist_km: float) -> Dict[str, Any]:
+    return {
+        **center,
+        "distance_km": round(dist_km, 2),
+        "estimated_wait_time_minutes": wait_estimator.estimate(center["id"]),
+    }
+
+def get_nearest_service_centers(location_lat: float, location_lon: float, k: Optional[int] = None,
+                                radius_km: Optional[float] = None):
+    """Centers nearest first; all of them unless limited to `k` and/or `radius_km`."""
+    if radius_km is not None:
+        hits = SERVICE_CENTER_INDEX.within(location_lat, location_lon, radius_km)[:k]
+    else:
+        hits = SERVICE_CENTER_INDEX.nearest(location_lat, location_lon, k)
+    return [_center_result(c, d) for c, d in hits]
 
 def _notify_manager(center, booking):
     print(f"[Manager Notify] -> {center['manager']} | Booking: {booking}")
@@ -114,52 +186,211 @@ def _notify_manager(center, booking):
 def _notify_fleet(booking):
     print(f"[Fleet Notify] -> fleet@autodoc.local | Booking: {booking}")
 
+def _booking_opened(center_id: str, chassis: str):
+    """Live wait-time and alert-routing updates for a new booking (API or agent)."""
+    wait_estimator.booking_opened(center_id)
+    alert_stream.routing.setdefault(chassis, {"dealer_id": None})["service_center_id"] = center_id
+
+async def _refresh_alert_routing():
+    """Keep the vehicle -> dealer / service center map used by /alerts/stream filters current for alerting vehicles."""
+    while True:
+        try:
+            alert_stream.routing = await run_db(vehicle_alert_routing, list(alert_service.active_alerts))
+        except Exception as e:
+            print(f"[AlertStream] routing refresh failed: {e}")
+        await asyncio.sleep(ALERT_ROUTING_REFRESH_SECONDS)
+
+# vehicle -> in-flight routing lookup (also keeps the task referenced)
+_ROUTING_LOOKUPS: Dict[str, asyncio.Task] = {}
+
+async def _route_new_alert(vid: str):
+    try:
+        alert_stream.routing.update(await run_db(vehicle_alert_routing, [vid]))
+        alert = alert_service.get_alert_for_vehicle(vid)
+        if alert is not None and vid in alert_stream.routing:
+            # Re-announce now that dealer / center filters can match it
+            alert_stream.publish("updated", alert)
+    except Exception as e:
+        print(f"[AlertStream] routing lookup for {vid} failed: {e}")
+    finally:
+        _ROUTING_LOOKUPS.pop(vid, None)
+
+def _on_alert_event(kind: str, alert: Dict[str, Any]):
+    # Routing is only kept for alerting vehicles; look up newcomers right away
+    vid = alert["vehicle_id"]
+    if kind == "raised" and vid not in alert_stream.routing and vid not in _ROUTING_LOOKUPS:
+        _ROUTING_LOOKUPS[vid] = asyncio.get_running_loop().create_task(_route_new_alert(vid))
+
+alert_service.add_listener(_on_alert_event)
+
+async def _reconcile_wait_times():
+    """Reload queue state from service_bookings; live updates happen on each booking / status change."""
+    while True:
+        try:
+            open_counts, completions = await run_db(service_center_load, wait_estimator.window_s / 3600)
+            wait_estimator.load(open_counts, completions)
+        except Exception as e:
+            print(f"[WaitTime] reconcile failed: {e}")
+        await asyncio.sleep(WAIT_RECONCILE_SECONDS)
+
 # --- API ENDPOINTS ---
 
 @app.on_event("startup")
-def startup_event():
+async def startup_event():
     # Only init DB if needed, robust_db handles most
+    telemetry_writer.start()
+    agent_dispatcher.start()
+    # Agent bookings commit on tool threads; apply them on the loop
+    loop = asyncio.get_running_loop()
+    add_booking_listener(lambda center_id, chassis: loop.call_soon_threadsafe(_booking_opened, center_id, chassis))
+    BACKGROUND_TASKS.append(asyncio.create_task(telemetry_maintenance_loop()))
+    BACKGROUND_TASKS.append(asyncio.create_task(_refresh_alert_routing()))
+    BACKGROUND_TASKS.append(asyncio.create_task(_reconcile_wait_times()))
     print("✅ System Online: Agents Ready & Simulation Active")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in BACKGROUND_TASKS:
+        task.cancel()
+    await agent_dispatcher.stop()
+    await telemetry_writer.stop()
+
+# --- LOGIN & SESSIONS ---
+# Request role -> users.role allowed to use it
+LOGIN_ROLES = {"dealer": "ADMIN", "user": "OWNER"}
+
+password_verifier = PasswordVerifier(
+    workers=int(os.getenv("PASSWORD_WORKERS", str(PASSWORD_WORKERS))),
+    max_pending=int(os.getenv("LOGIN_MAX_PENDING", str(PASSWORD_MAX_PENDING))),
+)
+_session_secret = os.getenv("SESSION_SECRET")
+if not _session_secret:
+    print("⚠️ SESSION_SECRET not set; session tokens will not survive a restart")
+session_tokens = SessionTokens(
+    _session_secret.encode() if _session_secret else secrets.token_bytes(32),
+    ttl_seconds=int(os.getenv("SESSION_TTL_SECONDS", str(SESSION_TTL_SECONDS))),
+)
+
+async def _session_profile(claims: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Dealers come from the snapshot cache, so this is usually a dict lookup
+    if claims["role"] == "dealer":
+        return await run_db(get_dealer_snapshot, claims["dealer_id"])
+    return await run_db(get_owner_profile, claims["sub"])
+
 @app.post("/login")
 async def login(req: LoginRequest):
-    if req.role == "dealer":
-        dealer = authenticate_dealer(req.username, req.password)
-        if not dealer: raise HTTPException(401, "Invalid Dealer Login")
-        return {"role": "dealer", "data": dealer}
-    if req.role == "user":
-        user = authenticate_owner(req.username, req.password)
-        if not user: raise HTTPException(401, "Invalid User Login")
-        return {"role": "user", "data": user}
-    raise HTTPException(400, "Unknown Role")
+    """Password login; returns the profile plus a signed session token for GET /session."""
+    if req.role not in LOGIN_ROLES: raise HTTPException(400, "Unknown Role")
+    failed = "Invalid Dealer Login" if req.role == "dealer" else "Invalid User Login"
+    record = await run_db(get_login_record, req.username)
+    # [FIX] Enforce Role Check
+    if not record or record["role"] != LOGIN_ROLES[req.role]: raise HTTPException(401, failed)
+    if req.role == "dealer" and not record["dealer_id"]: raise HTTPException(401, failed)
+    try:
+        ok = await password_verifier.verify(req.password, record["password_hash"])
+    except LoginThrottled:
+        raise HTTPException(503, "Too many logins in progress, retry shortly", headers={"Retry-After": "1"})
+    if not ok: raise HTTPException(401, failed)
+    claims = {"sub": record["user_id"], "role": req.role, "dealer_id": record["dealer_id"]}
+    data = await _session_profile(claims)
+    if not data: raise HTTPException(401, failed)
+    return {"role": req.role, "data": data, **session_tokens.issue(claims)}
+
+@app.get("/session")
+async def get_session(request: Request):
+    """Resume a session from `Authorization: Bearer <token>` without re-checking the password."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    claims = session_tokens.verify(token.strip()) if scheme.lower() == "bearer" else None
+    if not claims or claims.get("role") not in LOGIN_ROLES: raise HTTPException(401, "Invalid or expired session")
+    data = await _session_profile(claims)
+    if not data: raise HTTPException(401, "Invalid or expired session")
+    return {"role": claims["role"], "data": data, "expires_at": claims["exp"]}
+
+@app.get("/auth/stats")
+async def auth_stats():
+    return password_verifier.stats()
 
 @app.post("/dealer/add-stock")
 async def api_add_stock(req: AddStockRequest):
-    success = add_stock(req.dealer_id, req.chassis_number, req.model)
+    success = await run_db(add_stock, req.dealer_id, req.chassis_number, req.model)
     if not success: raise HTTPException(400, "Failed to add stock")
-    latest = get_dealer_snapshot(req.dealer_id)
+    latest = await run_db(get_dealer_snapshot, req.dealer_id)
     if not latest: raise HTTPException(404, "Dealer not found")
     return latest["inventory"]
 
 @app.post("/dealer/assign")
 async def api_assign(req: AssignRequest):
-    success, msg = assign_vehicle(req.dealer_id, req.chassis_number, req.target_username)
+    success, msg = await run_db(assign_vehicle, req.dealer_id, req.chassis_number, req.target_username)
     if not success: raise HTTPException(400, msg)
-    dealer = get_dealer_snapshot(req.dealer_id)
+    dealer = await run_db(get_dealer_snapshot, req.dealer_id)
     return {"inventory": dealer["inventory"], "sold": dealer["sold_vehicles"]}
 
+# --- BULK DEALER OPERATIONS ---
+MAX_BULK_DEALER_ROWS = 5000
+
+async def _bulk_dealer_rows(request: Request, key: str) -> Tuple[str, List[Any]]:
+    """
+    (dealer_id, rows) from either a CSV body (Content-Type: text/csv, header
+    row, dealer_id as a query param) or JSON: a bare array with ?dealer_id=,
+    or {"dealer_id": ..., key: [...]}.
+    """
+    dealer_id = request.query_params.get("dealer_id")
+    if "csv" in request.headers.get("content-type", ""):
+        try:
+            text = (await request.body()).decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(400, "CSV body must be UTF-8")
+        rows: Any = list(csv.DictReader(io.StringIO(text)))
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(400, "Body must be JSON or CSV")
+        if isinstance(body, dict):
+            dealer_id = body.get("dealer_id") or dealer_id
+            rows = body.get(key)
+        else:
+            rows = body
+    if not dealer_id:
+        raise HTTPException(400, "dealer_id is required")
+    if not isinstance(rows, list):
+        raise HTTPException(400, f"Expected a JSON array or {{\"{key}\": [...]}}")
+    if len(rows) > MAX_BULK_DEALER_ROWS:
+        raise HTTPException(413, f"At most {MAX_BULK_DEALER_ROWS} rows per request")
+    return str(dealer_id), rows
+
+def _bulk_report(done_key: str, done: List[Dict[str, Any]], errors: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {done_key: len(done), "rejected": len(errors), "errors": errors[:MAX_REPORTED_ERRORS], "vehicles": done}
+
+@app.post("/dealer/add-stock/bulk")
+async def api_add_stock_bulk(request: Request):
+    """Add many vehicles in one transaction; rows are {chassis_number, model}. Bad rows are reported, not fatal."""
+    dealer_id, rows = await _bulk_dealer_rows(request, "vehicles")
+    result = await run_db(add_stock_bulk, dealer_id, rows)
+    if result is None: raise HTTPException(404, "Dealer not found")
+    added, errors = result
+    return _bulk_report("added", added, errors)
+
+@app.post("/dealer/assign/bulk")
+async def api_assign_bulk(request: Request):
+    """Assign many vehicles in one transaction; rows are {chassis_number, target_username}."""
+    dealer_id, rows = await _bulk_dealer_rows(request, "assignments")
+    sold, errors = await run_db(assign_vehicles_bulk, dealer_id, rows)
+    return _bulk_report("assigned", sold, errors)
+
 @app.post("/book-service")
 async def book_service(req: ServiceRequest):
     # Logic from original main.py
     center = None
     if req.center_id:
-        center = next((c for c in SERVICE_CENTERS if c["id"] == req.center_id), None)
+        center = SERVICE_CENTER_INDEX.get(req.center_id)
     if not center and req.location_lat is not None and req.location_lon is not None:
-        center = get_nearest_service_centers(req.location_lat, req.location_lon)[0]
+        center = get_nearest_service_centers(req.location_lat, req.location_lon, k=1)[0]
     if not center:
         raise HTTPException(400, "Center not provided and no location to infer nearest")
 
     ticket_id = f"SRV-{random.randint(10000,99999)}"
+    wait_minutes = wait_estimator.estimate(center["id"])
     booking = {
         "ticket_id": ticket_id,
         "vehicle_id": req.chassis_number,
@@ -169,47 +400,257 @@ async def book_service(req: ServiceRequest):
         "service_center": center["name"],
         "center_id": center["id"],
         "distance_km": center.get("distance_km"),
+        "estimated_wait_time_minutes": wait_minutes,
         "created_at": datetime.utcnow().isoformat(),
     }
 
     _notify_manager(center, booking)
     _notify_fleet(booking)
-    record_service_booking(ticket_id, req.chassis_number, req.owner_name, req.issue, center["id"], center["name"])
+    await run_db(record_service_booking, ticket_id, req.chassis_number, req.owner_name, req.issue, center["id"], center["name"])
+    _booking_opened(center["id"], req.chassis_number)
     
     return booking
 
 @app.get("/service-centers/nearest")
 async def nearest_centers(req: ServiceCenterRequest):
-    return {"centers": get_nearest_service_centers(req.location_lat, req.location_lon)}
+    return {"centers": get_nearest_service_centers(req.location_lat, req.location_lon, req.k, req.radius_km)}
+
+MAX_BATCH_LOCATIONS = 10000
+
+@app.post("/service-centers/nearest/batch")
+async def nearest_centers_batch(req: BatchServiceCenterRequest):
+    """k nearest centers for many locations in one vectorized pass (e.g. a whole fleet)."""
+    if len(req.locations) > MAX_BATCH_LOCATIONS:
+        raise HTTPException(413, f"At most {MAX_BATCH_LOCATIONS} locations per request")
+    if not req.locations:
+        return {"results": []}
+    idx, dist = SERVICE_CENTER_INDEX.nearest_batch(
+        [p.lat for p in req.locations], [p.lon for p in req.locations], req.k
+    )
+    centers = SERVICE_CENTER_INDEX.centers
+    return {"results": [
+        [{"id": centers[i]["id"], "name": centers[i]["name"], "distance_km": round(float(d), 2)} for i, d in zip(row_i, row_d)]
+        for row_i, row_d in zip(idx, dist)
+    ]}
+
+MAX_BOOKINGS_PAGE = 500
+BOOKINGS_EXPORT_PAGE = 1000
 
 @app.get("/manager/bookings")
-async def manager_bookings(center_id: Optional[str] = None):
-    return {"bookings": list_service_bookings(center_id)}
+async def manager_bookings(
+    center_id: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+):
+    """
+    Bookings newest first, one page at a time: pass the returned
+    `next_cursor` back as `cursor` for the following page. `format=ndjson`
+    streams every matching booking instead, one JSON object per line.
+    """
+    status = status.upper() if status else None
+    if format == "ndjson":
+        async def _lines():
+            page_cursor = None
+            while True:
+                # Keyset pages on the DB executor; only one page is in memory at a time
+                page, page_cursor = await run_db(list_service_bookings, center_id, status, BOOKINGS_EXPORT_PAGE, page_cursor)
+                if page:
+                    yield "".join(json.dumps(b) + "\n" for b in page)
+                if page_cursor is None:
+                    return
+        return StreamingResponse(_lines(), media_type="application/x-ndjson")
+    try:
+        bookings, next_cursor = await run_db(list_service_bookings, center_id, status, max(1, min(limit, MAX_BOOKINGS_PAGE)), cursor)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    return {"bookings": bookings, "next_cursor": next_cursor}
+
+@app.post("/manager/bookings/{ticket_id}/status")
+async def set_booking_status(ticket_id: str, req: BookingStatusRequest):
+    status = req.status.upper()
+    if status not in BOOKING_STATUSES:
+        raise HTTPException(400, f"status must be one of {sorted(BOOKING_STATUSES)}")
+    result = await run_db(update_booking_status, ticket_id, status)
+    if result is None: raise HTTPException(404, "Booking not found")
+    center_id, previous = result
+    wait_estimator.status_changed(center_id, previous, status)
+    return {"ticket_id": ticket_id, "status": status, "center_id": center_id,
+            "estimated_wait_time_minutes": wait_estimator.estimate(center_id) if center_id else None}
+
+MAX_ROUTE_VEHICLES = 20000
+
+@app.post("/fleet/route")
+async def fleet_route(req: FleetRouteRequest):
+    """
+    Capacity-aware assignment of many vehicles to service centers at once.
+    With `from_alerts`, every vehicle with an active alert and a known
+    position is routed as well (the proactive agent path).
+    """
+    started = time.perf_counter()
+    vehicles = [v.dict() for v in req.vehicles]
+    if req.from_alerts:
+        listed = {v["vehicle_id"] for v in vehicles}
+        alerted = [a["vehicle_id"] for a in alert_service.all_alerts() if a["vehicle_id"] not in listed]
+        vehicles += locate_vehicles(alerted, VEHICLE_HEALTH_HISTORY.latest)
+    if len(vehicles) > MAX_ROUTE_VEHICLES:
+        raise HTTPException(413, f"At most {MAX_ROUTE_VEHICLES} vehicles per batch")
+    plan = route_fleet(vehicles, SERVICE_CENTER_INDEX, wait_estimator, candidates=max(1, req.candidates))
+    plan["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return plan
+
+@app.get("/service-centers/wait-times")
+async def service_center_wait_times():
+    return {"centers": {c["id"]: {"open_tickets": wait_estimator.open_tickets(c["id"]),
+                                  "estimated_wait_minutes": wait_estimator.estimate(c["id"])}
+                        for c in SERVICE_CENTERS}}
 
 @app.get("/security/logs")
 async def security_logs():
     return {"logs": SECURITY_LOGS[-200:]}
 
 @app.get("/alerts/active")
-async def get_active_alerts():
+async def get_active_alerts(severity: Optional[str] = None):
     """
-    Fetches active alerts for all vehicles.
+    Fetches active alerts for all vehicles (optionally one severity).
     """
+    alerts = alert_service.alerts_by_severity(severity) if severity else alert_service.all_alerts()
     active_alerts = []
-    # Iterate over all vehicles we have history for
-    for vid in VEHICLE_HEALTH_HISTORY.keys():
-        alert = alert_service.get_alert_for_vehicle(vid)
-        if alert:
-            # Get latest telemetry for context
-            latest = VEHICLE_HEALTH_HISTORY[vid][-1]
-            active_alerts.append({
-                "vehicle_id": vid,
-                "predicted_failure_type": alert, 
-                "root_cause_sensor": latest.get("root_cause_sensor", "Unknown"),
-                "risk_score": latest.get("risk_score_numeric", 0)
-            })
+    for alert in alerts:
+        active_alerts.append({
+            "vehicle_id": alert["vehicle_id"],
+            "predicted_failure_type": alert.get("predicted_failure_type", "Unknown"),
+            "root_cause_sensor": alert.get("root_cause_sensor", "Unknown"),
+            "risk_score": alert.get("risk_score", 0),
+            "severity": alert["severity"],
+            "message": alert.get("message"),
+        })
             
-    return {"alerts": active_alerts}
+    return {"alerts": active_alerts, "counts": alert_service.counts()}
+
+ALERT_STREAM_KEEPALIVE = 15.0
+
+@app.get("/alerts/stream")
+async def stream_alerts(
+    request: Request,
+    dealer_id: Optional[str] = None,
+    center_id: Optional[str] = None,
+    since: Optional[int] = None,
+):
+    """
+    Server-Sent Events feed of alert raised/updated/cleared events, optionally
+    for one dealer or service center. Each event's `id` is its sequence
+    number; reconnecting with Last-Event-ID (or, without the header, ?since=)
+    replays what was missed. If that is no longer available a `snapshot`
+    event with the current active alerts is sent first.
+    """
+    last_id = request.headers.get("last-event-id")
+    if last_id and last_id.isdigit():
+        # EventSource reconnects to the same URL, ?since= included; the header is where it actually got to
+        since = int(last_id)
+    # Registered before replaying so nothing published in between is lost
+    client = alert_stream.connect(dealer_id, center_id)
+
+    def _snapshot() -> str:
+        alerts = [
+            a for a in alert_service.all_alerts()
+            if client.matches(alert_stream.routing.get(a["vehicle_id"], {}))
+        ]
+        return sse_message({"seq": alert_stream.seq, "event": "snapshot", "alerts": alerts})
+
+    async def _events():
+        try:
+            sent = alert_stream.seq
+            backlog = alert_stream.since(since) if since is not None else None
+            if backlog is None:
+                yield _snapshot()
+            else:
+                for event in backlog:
+                    if client.matches(event):
+                        yield sse_message(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(client.queue.get(), ALERT_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if client.lagged:
+                        break
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if event["seq"] > sent:
+                    yield sse_message(event)
+                if client.lagged and client.queue.empty():
+                    # Fell behind: close so the browser reconnects with Last-Event-ID
+                    break
+        finally:
+            alert_stream.disconnect(client)
+
+    return StreamingResponse(_events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/alerts/stream/stats")
+async def alert_stream_stats():
+    return alert_stream.stats()
+
+@app.get("/vehicles/{vehicle_id}/history")
+async def vehicle_history(vehicle_id: str, since: Optional[str] = None, fields: Optional[str] = None):
+    """
+    Slice of a vehicle's telemetry history. `since` is epoch seconds or an ISO
+    timestamp (exclusive); `fields` is a comma-separated list of columns.
+    """
+    if vehicle_id not in VEHICLE_HEALTH_HISTORY:
+        raise HTTPException(404, "No history for vehicle")
+    since_ts = None
+    if since:
+        try:
+            since_ts = float(since)
+        except ValueError:
+            try:
+                parsed = datetime.fromisoformat(since)
+            except ValueError:
+                raise HTTPException(400, "since must be epoch seconds or ISO-8601")
+            # Telemetry timestamps are naive UTC
+            since_ts = (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    ts, cols = VEHICLE_HEALTH_HISTORY.window(vehicle_id, since_ts, field_list)
+    return {
+        "vehicle_id": vehicle_id,
+        "count": len(ts),
+        "timestamps": ts.tolist(),
+        # NaN (field absent in that sample) is not valid JSON
+        "fields": {name: [None if v != v else v for v in col.tolist()] for name, col in cols.items()},
+    }
+
+def _parse_iso_utc(value: str, name: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(400, f"{name} must be ISO-8601")
+    # Stored timestamps are naive UTC
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+@app.get("/vehicles/{vehicle_id}/telemetry")
+async def vehicle_telemetry_range(
+    vehicle_id: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    fields: Optional[str] = None,
+    max_points: int = 1000,
+    resolution: Optional[str] = None,
+):
+    """
+    Persisted history for a time range. Unless `resolution` (raw|1m|1h) is
+    given, the finest resolution that fits `max_points` is used. `truncated`
+    is set when only the newest `max_points` points of the range are returned.
+    """
+    end_dt = _parse_iso_utc(end, "end") if end else datetime.utcnow()
+    start_dt = _parse_iso_utc(start, "start") if start else end_dt - timedelta(hours=1)
+    if resolution not in (None, "raw", "1m", "1h"):
+        raise HTTPException(400, "resolution must be raw, 1m or 1h")
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    max_points = max(1, min(max_points, 10000))
+    return await asyncio.to_thread(query_history, vehicle_id, start_dt, end_dt, field_list, max_points, resolution)
 
 @app.post("/toggle-attack/{status}")
 async def toggle_attack(status: bool):
@@ -220,8 +661,7 @@ async def toggle_attack(status: bool):
 # --- INTELLIGENT CHATBOT (UPDATED) ---
 @app.post("/chatbot/query")
 async def chatbot_query(payload: ChatbotQuery):
-    history = VEHICLE_HEALTH_HISTORY.get(payload.chassis_number, [])
-    latest = history[-1] if history else {}
+    latest = VEHICLE_HEALTH_HISTORY.latest(payload.chassis_number)
     
     # 1. Helper to flatten complex telemetry for the LLM
     def _flat(v):
@@ -293,63 +733,368 @@ def generate_telemetry(chassis_number):
 def _telemetry_behavior_flags(sample: Dict[str, Any]) -> Dict[str, Any]:
     flags = {}
     if sample.get("temperature", 0) > 200: flags["impossible_values"] = True
+    if feature_store.is_anomalous(sample.get("vehicle_id")): flags["time_series_anomaly"] = True
     return flags
 
+def process_vehicle_batch(vids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """One generate -> score -> alert -> UEBA pass for every due vehicle. Runs once per tick, shared by all viewers."""
+    # 1. Generate Telemetry
+    now = datetime.utcnow().isoformat()
+    samples = []
+    for vid in vids:
+        raw = generate_telemetry(vid)
+        raw["timestamp"] = now
+        samples.append(raw)
+
+    alert_service.expire()
+
+    # 2. Predictive Analysis (one vectorized call per scoring profile)
+    return _score_samples(samples, lambda raw: VEHICLE_PROFILES.get(raw["vehicle_id"]))
+
+def _score_samples(samples: List[Dict[str, Any]], profile_for) -> Dict[str, Dict[str, Any]]:
+    """Feature update and batched scoring grouped by profile, then per-sample finishing; returns payloads by vehicle."""
+    groups: Dict[Optional[ScoringProfile], List[Dict[str, Any]]] = {}
+    features: Dict[Optional[ScoringProfile], List[Dict[str, float]]] = {}
+    for raw in samples:
+        vid = raw["vehicle_id"]
+        feature_store.update(vid, raw)
+        profile = profile_for(raw)
+        groups.setdefault(profile, []).append(raw)
+        # Scored on the smoothed streaming features, not the lone instantaneous reading
+        features.setdefault(profile, []).append(feature_store.projected_values(vid))
+
+    payloads = {}
+    for profile, group in groups.items():
+        out = predict_breakdown_risk_batch(group, profile=profile, features=features[profile])
+        for i, raw in enumerate(group):
+            vid = raw["vehicle_id"]
+            model_output = {
+                "vehicle_id": vid,
+                "risk_score": float(out["risk_scores"][i]),
+                "predicted_failure_type": out["predicted_failure_types"][i],
+                "root_cause_sensor": out["root_cause_sensors"][i],
+                "current_sensor_value": float(out["current_sensor_values"][i]),
+            }
+            payloads[vid] = _finish_scored_sample(vid, raw, model_output)
+    return payloads
+
+def _finish_scored_sample(vid: str, raw: Dict[str, Any], model_output: Dict[str, Any]) -> Dict[str, Any]:
+    """History, alert/agent trigger and UEBA for an already scored sample; returns the viewer payload."""
+    risk_score = model_output["risk_score"]
+
+    # 3. Store History (with the model output, for /alerts/active and the chatbot)
+    scored = {
+        **raw,
+        "risk_score_numeric": risk_score,
+        "predicted_failure_type": model_output["predicted_failure_type"],
+        "root_cause_sensor": model_output["root_cause_sensor"],
+    }
+    VEHICLE_HEALTH_HISTORY.append(vid, scored)
+    # Persisted in the background; never blocks the tick
+    telemetry_writer.enqueue(vid, raw["timestamp"], scored, raw.get("latitude"), raw.get("longitude"), raw.get("speed_kmh"))
+    
+    # 4. *** PROACTIVE AGENT TRIGGER ***
+    # This is the "Brain" intervention you wanted
+    agent_alert_msg = None
+    was_active = alert_service.is_alert_active(vid)
+    alert = alert_service.evaluate(model_output)
+    if alert is not None and not was_active:
+        print(f"🚨 CRITICAL RISK on {vid}. Triggering Autonomous Agent...")
+        
+        sys_prompt = f"SYSTEM ALERT: Critical failure predicted (Risk: {risk_score}). Telemetry: {json.dumps(raw)}"
+        
+        # Queued for a bounded pool of agent workers, most urgent first
+        dispatch = agent_dispatcher.submit(vid, risk_score, _vehicle_category(vid, raw), sys_prompt)
+        if dispatch == "dropped":
+            agent_alert_msg = "Autonomous Agent busy; alert raised for manual follow-up."
+        else:
+            agent_alert_msg = "Autonomous Agent dispatched."
+        alert = alert_service.trigger_alert(vid, "Critical Risk - Agent Active")
+
+    # 5. UEBA (access control is applied per role at send time)
+    ueba_out = ueba_analyze({}, {}, _telemetry_behavior_flags(raw), {})
+    UEBA_CACHE[vid] = ueba_out
+
+    # 6. Payload Construction
+    return {
+        **raw,
+        "risk_score_numeric": risk_score,
+        "predicted_failure_type": model_output["predicted_failure_type"],
+        "root_cause_sensor": model_output["root_cause_sensor"],
+        "alert": alert,
+        "ueba": ueba_out,
+        "agent_status": agent_alert_msg
+    }
+
+def _vehicle_category(vid: str, raw: Dict[str, Any]) -> Optional[str]:
+    profile = VEHICLE_PROFILES.get(vid)
+    return raw.get("vehicle_type") or (profile.name if profile else None)
+
+async def _run_proactive_agent(job: Dict[str, Any]):
+    vid = job["vehicle_id"]
+    # The alert may have cleared while the job waited; don't spend an LLM run on it
+    if not alert_service.is_alert_active(vid):
+        return
+    await agent_app.ainvoke(
+        {"messages": [HumanMessage(content=job["payload"])], "is_proactive": True},
+        config={"configurable": {"thread_id": f"chat_{vid}"}}
+    )
+
+agent_dispatcher = AgentDispatcher(
+    _run_proactive_agent,
+    workers=int(os.getenv("AGENT_WORKERS", "2")),
+    max_queue=int(os.getenv("AGENT_QUEUE_SIZE", "200")),
+    timeout=float(os.getenv("AGENT_TIMEOUT_SECONDS", "180")),
+)
+
+@app.get("/agent/dispatcher/stats")
+async def agent_dispatcher_stats():
+    return agent_dispatcher.stats()
+
+telemetry_hub = TelemetryHub(
+    process_vehicle_batch,
+    interval=float(os.getenv("TELEMETRY_TICK_SECONDS", "3.0")),
+    queue_size=int(os.getenv("WS_SEND_QUEUE", "8")),
+    policy=os.getenv("WS_BACKPRESSURE_POLICY", "drop_oldest"),
+    max_missed=int(os.getenv("WS_MAX_MISSED_FRAMES", "50")),
+)
+# A send that takes longer than this is treated as a dead/stalled client
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+
+@app.get("/telemetry/hub/stats")
+async def telemetry_hub_stats():
+    return telemetry_hub.stats()
+
+@app.get("/db/pool/stats")
+async def db_pool_stats():
+    return db_stats()
+
+@app.get("/telemetry/writer/stats")
+async def telemetry_writer_stats():
+    return telemetry_writer.stats()
+
+# --- BATCHED EXTERNAL INGEST ---
+def _ingest_samples(samples: List[Dict[str, Any]]) -> int:
+    """Run validated samples through scoring, history, alerts and UEBA; batched per scoring profile."""
+    now = datetime.utcnow().isoformat()
+    for raw in samples:
+        # An explicit null means "not given", same as a missing key
+        if raw.get("timestamp") is None:
+            raw["timestamp"] = now
+    payloads = _score_samples(samples, lambda raw: get_scoring_profile(raw.get("vehicle_type")))
+    for vid, payload in payloads.items():
+        telemetry_hub.publish(vid, payload)
+    # Fleet viewers get ingested samples as one batch, like a scheduler tick
+    telemetry_hub.flush()
+    return len(samples)
+
+async def _ingest_in_chunks(samples: List[Dict[str, Any]]) -> int:
+    """_ingest_samples a chunk at a time, yielding between chunks so ticks and SSE keep flowing during big uploads."""
+    accepted = 0
+    for i in range(0, len(samples), NDJSON_CHUNK_SAMPLES):
+        accepted += _ingest_samples(samples[i:i + NDJSON_CHUNK_SAMPLES])
+        await asyncio.sleep(0)
+    return accepted
+
+def _ingest_report(accepted: int, rejected: int, errors: List[Dict[str, Any]], started: float) -> Dict[str, Any]:
+    """`errors` lists at most MAX_REPORTED_ERRORS rows (the first ones); `rejected` counts all of them."""
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    return {
+        "accepted": accepted,
+        "rejected": rejected,
+        "errors": errors[:MAX_REPORTED_ERRORS],
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "samples_per_sec": round(accepted / elapsed, 1),
+    }
+
+@app.post("/telemetry/batch")
+async def ingest_telemetry_batch(request: Request):
+    """Bulk ingest: a JSON array of samples, or {"samples": [...]}. Up to MAX_BATCH_SAMPLES per request."""
+    started = time.perf_counter()
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(400, "Body must be JSON")
+    samples = body.get("samples") if isinstance(body, dict) else body
+    if not isinstance(samples, list):
+        raise HTTPException(400, "Expected a JSON array of samples")
+    if len(samples) > MAX_BATCH_SAMPLES:
+        raise HTTPException(413, f"At most {MAX_BATCH_SAMPLES} samples per batch; use /telemetry/ndjson for larger uploads")
+    valid, errors = split_valid(samples)
+    accepted = await _ingest_in_chunks(valid)
+    return _ingest_report(accepted, len(errors), errors, started)
+
+@app.post("/telemetry/ndjson")
+async def ingest_telemetry_ndjson(request: Request):
+    """Streaming ingest: one JSON sample per line, processed in chunks as the body arrives."""
+    started = time.perf_counter()
+    accepted = rejected = 0
+    errors: List[Dict[str, Any]] = []
+    async for chunk, indexes, parse_errors in iter_ndjson_chunks(request.stream()):
+        valid, bad = split_valid(chunk, indexes)
+        rejected += len(parse_errors) + len(bad)
+        if len(errors) < MAX_REPORTED_ERRORS:
+            # Only the first rows are reported, so the list stays bounded however bad the upload
+            errors = sorted(errors + parse_errors + bad, key=lambda e: e["index"])[:MAX_REPORTED_ERRORS]
+        accepted += _ingest_samples(valid)
+        await asyncio.sleep(0)
+    return _ingest_report(accepted, rejected, errors, started)
+
+async def _send_frame(websocket: WebSocket, data):
+    if isinstance(data, bytes):
+        send = websocket.send_bytes(data)
+    else:
+        send = websocket.send_text(data)
+    await asyncio.wait_for(send, WS_SEND_TIMEOUT)
+
+def _backpressure_policy(websocket: WebSocket) -> Optional[str]:
+    policy = websocket.query_params.get("backpressure")
+    return policy if policy in BACKPRESSURE_POLICIES else None
+
+async def _close_slow_consumer(websocket: WebSocket):
+    try:
+        await websocket.close(code=1013, reason="Client too slow")
+    except Exception:
+        pass
+
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: int):
+    """
+    Per-vehicle telemetry stream. `mode=compact` switches to keyframe + delta
+    messages (MessagePack when available); JSON full payloads remain the default.
+    `cadence` (seconds, one tick to 300) asks for slower updates, rounded to
+    whole ticks; a vehicle runs at the fastest cadence any current viewer asked for.
+    `backpressure` (drop_oldest | keep_latest | disconnect) overrides the
+    server's slow-client policy; disconnected clients get close code 1013.
+    """
     await websocket.accept()
     vid = websocket.query_params.get("vehicle_id", "UNKNOWN")
     role = websocket.query_params.get("role", "user")
-    
+    encoder = CompactEncoder() if websocket.query_params.get("mode") == "compact" else None
+    cadence = None
+    if websocket.query_params.get("cadence"):
+        try:
+            cadence = telemetry_hub.check_cadence(float(websocket.query_params["cadence"]))
+        except ValueError:
+            await websocket.close(code=1008, reason=f"cadence must be between {telemetry_hub.interval:g} and {MAX_CADENCE_S:g} seconds")
+            return
+    vehicle_type = websocket.query_params.get("vehicle_type")
+    if vehicle_type:
+        # Compiled once at import; only this vehicle's sensors are evaluated per tick
+        VEHICLE_PROFILES[vid] = get_scoring_profile(vehicle_type)
+
+    sub = telemetry_hub.subscribe(vid, role, _backpressure_policy(websocket))
+    if cadence is not None:
+        telemetry_hub.set_cadence(sub, cadence)
     try:
         while True:
-            # 1. Generate Telemetry
-            raw = generate_telemetry(vid)
-            raw["timestamp"] = datetime.utcnow().isoformat()
-            
-            # 2. Store History
-            hist = VEHICLE_HEALTH_HISTORY.setdefault(vid, [])
-            hist.append(raw)
-            if len(hist) > 300: hist.pop(0)
-
-            # 3. Predictive Analysis
-            model_output = predict_breakdown_risk(raw)
-            risk_score = model_output["risk_score"]
-            
-            # 4. *** PROACTIVE AGENT TRIGGER ***
-            # This is the "Brain" intervention you wanted
-            agent_alert_msg = None
-            if risk_score > 0.85 and not alert_service.is_alert_active(vid):
-                print(f"🚨 CRITICAL RISK on {vid}. Triggering Autonomous Agent...")
-                
-                sys_prompt = f"SYSTEM ALERT: Critical failure predicted (Risk: {risk_score}). Telemetry: {json.dumps(raw)}"
-                
-                # Fire and forget (or await if you want blocking)
-                asyncio.create_task(agent_app.ainvoke(
-                    {"messages": [HumanMessage(content=sys_prompt)], "is_proactive": True},
-                    config={"configurable": {"thread_id": f"chat_{vid}"}}
-                ))
-                agent_alert_msg = "Autonomous Agent dispatched."
-                alert_service.trigger_alert(vid, "Critical Risk - Agent Active")
-
-            # 5. UEBA & Access Control
-            ueba_out = ueba_analyze({}, {}, _telemetry_behavior_flags(raw), {})
-            UEBA_CACHE[vid] = ueba_out
-            ueba_view = apply_access_control(role, ueba_out)
-
-            # 6. Payload Construction
-            payload = {
-                **raw,
-                "risk_score_numeric": risk_score,
-                "predicted_failure_type": model_output["predicted_failure_type"],
-                "root_cause_sensor": model_output["root_cause_sensor"],
-                "alert": alert_service.get_alert_for_vehicle(vid),
-                "ueba": ueba_view,
-                "agent_status": agent_alert_msg
-            }
-            
-            await websocket.send_text(json.dumps(payload))
-            await asyncio.sleep(3)
+            frame = await sub.get()
+            if frame is None:
+                await _close_slow_consumer(websocket)
+                break
+            if encoder:
+                await _send_frame(websocket, encoder.message(frame, role))
+            else:
+                await _send_frame(websocket, frame.text_for(role))
             
     except WebSocketDisconnect:
-        pass
\ No newline at end of file
+        pass
+    except asyncio.TimeoutError:
+        sub.overflowed = True
+        await _close_slow_consumer(websocket)
+    finally:
+        telemetry_hub.unsubscribe(sub)
+        # Profiles only steer ticks for watched vehicles; drop them with the last viewer
+        if not telemetry_hub.watched(vid):
+            VEHICLE_PROFILES.pop(vid, None)
+
+FLEET_MAX_VEHICLES = 5000
+# Pending control replies per fleet socket; the reader waits when it is full
+FLEET_CONTROL_REPLIES = 32
+
+@app.websocket("/ws/fleet/{client_id}")
+async def fleet_websocket_endpoint(websocket: WebSocket, client_id: int):
+    """
+    Multiplexed fleet socket. Control messages:
+      {"action": "subscribe", "vehicle_ids": [...]}
+      {"action": "unsubscribe", "vehicle_ids": [...]}   (omit ids to drop all)
+    Server frames: {"type": "batch", "count": n, "vehicles": [payload, ...]},
+    one per tick with every vehicle that changed. With `mode=compact` each
+    batch is instead an array of keyframe/delta messages (see /ws).
+    """
+    await websocket.accept()
+    role = websocket.query_params.get("role", "dealer")
+    encoder = CompactEncoder() if websocket.query_params.get("mode") == "compact" else None
+    sub = telemetry_hub.fleet_subscription(role, _backpressure_policy(websocket))
+
+    # Control replies go through the send loop below, so only one task ever writes to the socket
+    replies: "asyncio.Queue[str]" = asyncio.Queue(FLEET_CONTROL_REPLIES)
+
+    async def _read_controls():
+        while True:
+            try:
+                msg = json.loads(await websocket.receive_text())
+            except WebSocketDisconnect:
+                return
+            except json.JSONDecodeError:
+                await replies.put(json.dumps({"type": "error", "detail": "Invalid JSON"}))
+                continue
+            if not isinstance(msg, dict):
+                await replies.put(json.dumps({"type": "error", "detail": "Control message must be a JSON object"}))
+                continue
+            raw_ids = msg.get("vehicle_ids") or []
+            if not isinstance(raw_ids, list):
+                await replies.put(json.dumps({"type": "error", "detail": "vehicle_ids must be an array"}))
+                continue
+            ids = [str(v) for v in raw_ids]
+            action = msg.get("action")
+            if action == "subscribe":
+                room = FLEET_MAX_VEHICLES - len(sub.vehicle_ids)
+                telemetry_hub.subscribe_fleet(sub, ids[:max(room, 0)])
+            elif action == "unsubscribe":
+                for vid in ids or list(sub.vehicle_ids):
+                    if encoder: encoder.forget(vid)
+                telemetry_hub.unsubscribe_fleet(sub, ids or None)
+            else:
+                await replies.put(json.dumps({"type": "error", "detail": f"Unknown action: {action}"}))
+                continue
+            await replies.put(json.dumps({"type": "subscriptions", "vehicle_ids": sorted(sub.vehicle_ids)}))
+
+    reader = asyncio.create_task(_read_controls())
+    batch = reply = None
+    try:
+        while True:
+            if batch is None:
+                batch = asyncio.ensure_future(sub.next_batch())
+            if reply is None:
+                reply = asyncio.ensure_future(replies.get())
+            done, _ = await asyncio.wait({reader, batch, reply}, return_when=asyncio.FIRST_COMPLETED)
+            if reply in done:
+                await _send_frame(websocket, reply.result())
+                reply = None
+            if reader in done:
+                if not reader.cancelled() and reader.exception() is not None:
+                    print(f"[FleetWS] control reader failed: {reader.exception()}")
+                break
+            if batch not in done:
+                continue
+            frames, batch = batch.result(), None
+            if frames is None:
+                await _close_slow_consumer(websocket)
+                break
+            frames = [f for f in frames if f.vehicle_id in sub.vehicle_ids]
+            if frames:
+                if encoder:
+                    await _send_frame(websocket, encoder.encode_batch(frames, role))
+                else:
+                    await _send_frame(websocket, sub.encode_batch(frames))
+    except WebSocketDisconnect:
+        pass
+    except asyncio.TimeoutError:
+        sub.overflowed = True
+        await _close_slow_consumer(websocket)
+    finally:
+        for task in (reader, batch, reply):
+            if task is not None:
+                task.cancel()
+        telemetry_hub.close_fleet(sub)
@@ -23,6 +23,9 @@ DB_CONFIG = {
 # SQL SCHEMA
 SQL_SETUP = [
     """CREATE EXTENSION IF NOT EXISTS "pgcrypto";""",
+    """DROP TABLE IF EXISTS telemetry_stream CASCADE;""",
+    """DROP TABLE IF EXISTS telemetry_rollup_1m CASCADE;""",
+    """DROP TABLE IF EXISTS telemetry_rollup_1h CASCADE;""",
     """DROP TABLE IF EXISTS service_bookings CASCADE;""",
     """DROP TABLE IF EXISTS maintenance_history CASCADE;""",
     """DROP TABLE IF EXISTS capa_records CASCADE;""",
@@ -74,12 +77,32 @@ SQL_SETUP = [
         service_center_name VARCHAR(100),
         issue TEXT,
         status VARCHAR(20) DEFAULT 'OPEN',
-        created_at TIMESTAMP DEFAULT NOW()
+        created_at TIMESTAMP DEFAULT NOW(),
+        closed_at TIMESTAMP
     );""",
+    """CREATE INDEX idx_bookings_created ON service_bookings (created_at DESC, booking_id DESC);""",
+    """CREATE INDEX idx_bookings_center_created ON service_bookings (service_center_id, created_at DESC, booking_id DESC);""",
+    """CREATE INDEX idx_bookings_center_status_created ON service_bookings (service_center_id, status, created_at DESC, booking_id DESC);""",
+
+    """CREATE TABLE telemetry_stream (
+        event_id BIGSERIAL,
+        vehicle_id VARCHAR(50) NOT NULL,
+        timestamp TIMESTAMP NOT NULL DEFAULT NOW(),
+        latitude DECIMAL(9,6),
+        longitude DECIMAL(9,6),
+        speed_kmh DECIMAL(5,2),
+        sensor_data JSONB,
+        PRIMARY KEY (event_id, timestamp)
+    ) PARTITION BY RANGE (timestamp);""",
+    """CREATE TABLE telemetry_stream_default PARTITION OF telemetry_stream DEFAULT;""",
+    """CREATE INDEX idx_telemetry_vehicle_time ON telemetry_stream (vehicle_id, timestamp DESC);""",
+    """CREATE TABLE telemetry_rollup_1m (vehicle_id VARCHAR(50), sensor VARCHAR(64), bucket TIMESTAMP, min_val DOUBLE PRECISION NOT NULL, max_val DOUBLE PRECISION NOT NULL, sum_val DOUBLE PRECISION NOT NULL, count_val BIGINT NOT NULL, PRIMARY KEY (vehicle_id, sensor, bucket));""",
+    """CREATE TABLE telemetry_rollup_1h (vehicle_id VARCHAR(50), sensor VARCHAR(64), bucket TIMESTAMP, min_val DOUBLE PRECISION NOT NULL, max_val DOUBLE PRECISION NOT NULL, sum_val DOUBLE PRECISION NOT NULL, count_val BIGINT NOT NULL, PRIMARY KEY (vehicle_id, sensor, bucket));""",
 
     """CREATE TABLE maintenance_history (history_id SERIAL PRIMARY KEY, chassis_number VARCHAR(50), service_date DATE, service_type VARCHAR(100), description TEXT, cost DECIMAL);""",
     """CREATE TABLE capa_records (capa_id SERIAL PRIMARY KEY, component VARCHAR(100), defect_type VARCHAR(100), action_required TEXT, batch_id VARCHAR(50));""",
-    """CREATE TABLE appointments (appt_id SERIAL PRIMARY KEY, slot_time VARCHAR(20), is_booked BOOLEAN DEFAULT FALSE, booked_chassis VARCHAR(50));"""
+    """CREATE TABLE appointments (appt_id SERIAL PRIMARY KEY, service_center_id VARCHAR(50), slot_time VARCHAR(20), is_booked BOOLEAN DEFAULT FALSE, booked_chassis VARCHAR(50), ticket_id VARCHAR(30));""",
+    """CREATE INDEX idx_appointments_center_slot ON appointments (service_center_id, slot_time, is_booked);"""
 ]
 
 # --- SEED DATA ---
@@ -134,6 +157,11 @@ VEHICLES = [
     {"chassis": "MAH-SCN-109", "dlr": "MAH_DLR", "owner": None,     "model": "Scorpio Classic", "cat": "4W", "fuel": "DIESEL"},
 ]
 
+# 4. Appointment slots (center ids match SERVICE_CENTERS in main.py)
+SLOT_CENTERS = ["SC_MUMBAI", "SC_PUNE", "SC_DELHI", "SC_BLR", "SC_CHENNAI", "SC_KOLKATA"]
+SLOT_TIMES = ["09:00", "10:00", "11:00", "14:00", "15:00"]
+SLOT_BAYS = 2
+
 def run_setup():
     try:
         conn = psycopg2.connect(**DB_CONFIG)
@@ -188,8 +216,16 @@ def run_setup():
         
         print(f"🚗 Added {len(VEHICLES)} Vehicles.")
 
-        # 5. Add some history
-        cur.execute("INSERT INTO appointments (slot_time) VALUES ('09:00'), ('10:00'), ('11:00'), ('14:00'), ('15:00')")
+        # 5. Daily telemetry partitions for the next few days
+        from telemetry_storage import partition_ddl
+        for sql in partition_ddl(days_ahead=3): cur.execute(sql)
+
+        # 6. Add some history
+        # One slot row per bay, per center and time
+        cur.execute("""
+            INSERT INTO appointments (service_center_id, slot_time)
+            SELECT c, t FROM unnest(%s) AS c CROSS JOIN unnest(%s) AS t CROSS JOIN generate_series(1, %s) AS bay
+        """, (SLOT_CENTERS, SLOT_TIMES, SLOT_BAYS))
         
         print("✅ Database Reset Complete!")
         conn.close()
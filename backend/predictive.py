@@ -1,4 +1,6 @@
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
 
 def _get_val(value: Any) -> float:
     """
@@ -12,158 +14,186 @@ def _get_val(value: Any) -> float:
     except (TypeError, ValueError):
         return 0.0
 
-def _normalize(telemetry: Dict[str, Any]) -> Dict[str, float]:
+# Precompiled sensor spec table:
+# (sensor, default, offset, scale, mode, weight, failure label)
+#   above     -> max(0, (v - offset) / scale)
+#   below     -> max(0, (offset - v) / scale)
+#   inverse   -> max(0, 1 - v / scale)
+#   ratio     -> min(1, v / scale)
+#   deviation -> min(1, |v - offset| / scale)
+#   flag      -> 1.0 if the raw value is truthy else 0.0
+_SENSOR_SPECS: Tuple[Tuple[str, Any, float, float, str, float, str], ...] = (
+    ("temperature", 0, 85, 25, "above", 0.15, "Engine Overheating"),
+    ("vibration", 0, 0, 6, "ratio", 0.1, "Engine mount / accessory imbalance"),
+    ("oil_quality_contaminants_V_oil", 1, 0, 1, "inverse", 0.2, "Engine Seizure Risk due to low oil quality"),
+    ("vibration_rms_A_rms", 0, 0, 8, "ratio", 0.15, "Drivetrain imbalance (RMS vibration high)"),
+    ("brake_pad_wear_percent", 0, 0, 100, "ratio", 0.1, "Brake Fade Risk (pads near limit)"),
+    ("battery_soh_percent", 100, 0, 100, "inverse", 0.1, "Electrical instability (battery SOH low)"),
+    ("transmission_fluid_temp_C", 0, 80, 60, "above", 0.15, "Transmission Overheating"),
+    ("fuel_pressure_kPa", 350, 350, 250, "below", 0.05, "Fuel delivery instability (rail pressure low)"),
+    ("ev_battery_temp_C", 0, 40, 35, "above", 0.12, "EV Battery Thermal Risk"),
+    ("ev_voltage_stability", 1, 0, 1, "inverse", 0.1, "EV Voltage Instability"),
+    ("petrol_knock_index", 0, 0, 1.0, "ratio", 0.12, "Engine Knock Detected"),
+    ("petrol_fuel_trim", 0, 0, 25, "deviation", 0.08, "Fuel Trim Out of Range"),
+    ("truck_axle_load_imbalance", 0, 0, 1, "ratio", 0.1, "Axle Load Imbalance"),
+    ("truck_brake_air_pressure", 90, 90, 40, "below", 0.12, "Brake Air Pressure Low"),
+    ("ambulance_high_rpm_flag", None, 0, 1, "flag", 0.08, "High Duty RPM Pattern"),
+    ("motorcycle_vibration", 0, 0, 6, "ratio", 0.08, "Motorcycle Vibration High"),
+    ("motorcycle_lean_angle_deg", 0, 0, 60, "ratio", 0.05, "Aggressive Lean Angle"),
+    ("motorcycle_regulator_temp_C", 0, 70, 50, "above", 0.06, "Regulator Overheating"),
+    ("motorcycle_methane_ppm", 0, 0, 50, "ratio", 0.04, "Methane Detected Near Bike"),
+    ("petrol_air_fuel_ratio", 14.7, 14.7, 10, "deviation", 0.06, "Air-Fuel Ratio Out of Range"),
+    ("petrol_injector_duty_cycle", 0, 0, 100, "ratio", 0.06, "Injector Duty Cycle High"),
+    ("petrol_cranking_latency_ms", 0, 0, 800, "ratio", 0.04, "Slow Cranking Detected"),
+    ("petrol_delta_fuel_pressure_kPa", 0, 0, 80, "deviation", 0.05, "Fuel Pressure Delta Abnormal"),
+    ("truck_exhaust_temp_C", 0, 450, 400, "above", 0.08, "High Exhaust Temp"),
+    ("truck_thermal_variance", 0, 0, 1.0, "ratio", 0.05, "Thermal Variance High"),
+    ("truck_turbo_boost_kPa", 0, 180, 80, "above", 0.05, "Turbo Boost Over Spec"),
+    ("ambulance_suspension_load", 0, 0, 1.0, "ratio", 0.05, "Suspension Load High"),
+    ("ambulance_cabin_co2_ppm", 400, 800, 2000, "above", 0.05, "Cabin CO2 Elevated"),
+    ("ambulance_o2_tank_percent", 100, 50, 50, "below", 0.08, "O2 Tank Low"),
+    ("ambulance_fridge_temp_C", 0, 8, 12, "above", 0.04, "Fridge Temperature High"),
+    ("ambulance_suction_pressure_kPa", 70, 70, 40, "below", 0.05, "Suction Pressure Low"),
+    ("ambulance_iv_flow_rate_ml_min", 40, 10, 40, "below", 0.04, "IV Flow Rate Low"),
+    ("ev_igbt_temp_C", 0, 80, 70, "above", 0.06, "IGBT Temperature High"),
+    ("ev_stator_temp_C", 0, 90, 70, "above", 0.05, "Stator Temperature High"),
+    ("ev_rotor_alignment_error", 0, 0, 0.5, "ratio", 0.05, "Rotor Alignment Error"),
+    ("ev_bearing_vibration", 0, 0, 6, "ratio", 0.05, "Bearing Vibration High"),
+    ("ev_cell_delta_V", 0, 0, 0.2, "ratio", 0.04, "Cell Voltage Delta High"),
+    ("ev_internal_resistance_mOhm", 2, 6, 20, "above", 0.04, "Internal Resistance Rising"),
+    ("ev_contactor_temp_C", 0, 70, 50, "above", 0.04, "Contactor Temperature High"),
+)
+
+SENSOR_NAMES: Tuple[str, ...] = tuple(s[0] for s in _SENSOR_SPECS)
+_WEIGHTS: Dict[str, float] = {s[0]: s[5] for s in _SENSOR_SPECS}
+_FAILURE_LABELS: Dict[str, str] = {s[0]: s[6] for s in _SENSOR_SPECS}
+_TYPE_MULTIPLIERS: Dict[str, float] = {
+    "EV": 1.05,
+    "Petrol": 1.02,
+    "Truck": 1.07,
+    "Ambulance": 1.1,
+    "Motorcycle": 1.03,
+}
+
+def _norm_value(mode: str, value: float, offset: float, scale: float) -> float:
+    if mode == "above":
+        return max(0, (value - offset) / scale)
+    if mode == "below":
+        return max(0, (offset - value) / scale)
+    if mode == "inverse":
+        return max(0, 1 - value / scale)
+    if mode == "ratio":
+        return min(1, value / scale)
+    if mode == "deviation":
+        return min(1, abs(value - offset) / scale)
+    return 1.0 if value else 0.0
+
+def _normalize(
+    telemetry: Dict[str, Any],
+    specs: Sequence[tuple] = _SENSOR_SPECS,
+    features: Optional[Dict[str, float]] = None,
+) -> Dict[str, float]:
     # We use _get_val to safely handle both simple floats AND V3 redundant packets
-    return {
-        "temperature": max(0, (_get_val(telemetry.get("temperature", 0)) - 85) / 25),
-        "vibration": min(1, _get_val(telemetry.get("vibration", 0)) / 6),
-        "oil_quality_contaminants_V_oil": max(0, 1 - _get_val(telemetry.get("oil_quality_contaminants_V_oil", 1))),
-        "vibration_rms_A_rms": min(1, _get_val(telemetry.get("vibration_rms_A_rms", 0)) / 8),
-        "brake_pad_wear_percent": min(1, _get_val(telemetry.get("brake_pad_wear_percent", 0)) / 100),
-        "battery_soh_percent": max(0, 1 - _get_val(telemetry.get("battery_soh_percent", 100)) / 100),
-        "transmission_fluid_temp_C": max(0, (_get_val(telemetry.get("transmission_fluid_temp_C", 0)) - 80) / 60),
-        "fuel_pressure_kPa": max(0, (350 - _get_val(telemetry.get("fuel_pressure_kPa", 350))) / 250),
-        "ev_battery_temp_C": max(0, (_get_val(telemetry.get("ev_battery_temp_C", 0)) - 40) / 35),
-        "ev_voltage_stability": max(0, 1 - _get_val(telemetry.get("ev_voltage_stability", 1))),
-        "petrol_knock_index": min(1, _get_val(telemetry.get("petrol_knock_index", 0)) / 1.0),
-        "petrol_fuel_trim": min(1, abs(_get_val(telemetry.get("petrol_fuel_trim", 0))) / 25),
-        "truck_axle_load_imbalance": min(1, _get_val(telemetry.get("truck_axle_load_imbalance", 0))),
-        "truck_brake_air_pressure": max(0, (90 - _get_val(telemetry.get("truck_brake_air_pressure", 90))) / 40),
-        "ambulance_high_rpm_flag": 1.0 if telemetry.get("ambulance_high_rpm_flag") else 0.0,
-        "motorcycle_vibration": min(1, _get_val(telemetry.get("motorcycle_vibration", 0)) / 6),
-        "motorcycle_lean_angle_deg": min(1, _get_val(telemetry.get("motorcycle_lean_angle_deg", 0)) / 60),
-        "motorcycle_regulator_temp_C": max(0, (_get_val(telemetry.get("motorcycle_regulator_temp_C", 0)) - 70) / 50),
-        "motorcycle_methane_ppm": min(1, _get_val(telemetry.get("motorcycle_methane_ppm", 0)) / 50),
-        "petrol_air_fuel_ratio": min(1, abs(14.7 - _get_val(telemetry.get("petrol_air_fuel_ratio", 14.7))) / 10),
-        "petrol_injector_duty_cycle": min(1, _get_val(telemetry.get("petrol_injector_duty_cycle", 0)) / 100),
-        "petrol_cranking_latency_ms": min(1, _get_val(telemetry.get("petrol_cranking_latency_ms", 0)) / 800),
-        "petrol_delta_fuel_pressure_kPa": min(1, abs(_get_val(telemetry.get("petrol_delta_fuel_pressure_kPa", 0))) / 80),
-        "truck_exhaust_temp_C": max(0, (_get_val(telemetry.get("truck_exhaust_temp_C", 0)) - 450) / 400),
-        "truck_thermal_variance": min(1, _get_val(telemetry.get("truck_thermal_variance", 0)) / 1.0),
-        "truck_turbo_boost_kPa": max(0, (_get_val(telemetry.get("truck_turbo_boost_kPa", 0)) - 180) / 80),
-        "ambulance_suspension_load": min(1, _get_val(telemetry.get("ambulance_suspension_load", 0)) / 1.0),
-        "ambulance_cabin_co2_ppm": max(0, (_get_val(telemetry.get("ambulance_cabin_co2_ppm", 400)) - 800) / 2000),
-        "ambulance_o2_tank_percent": max(0, (50 - _get_val(telemetry.get("ambulance_o2_tank_percent", 100))) / 50),
-        "ambulance_fridge_temp_C": max(0, (_get_val(telemetry.get("ambulance_fridge_temp_C", 0)) - 8) / 12),
-        "ambulance_suction_pressure_kPa": max(0, (70 - _get_val(telemetry.get("ambulance_suction_pressure_kPa", 70))) / 40),
-        "ambulance_iv_flow_rate_ml_min": max(0, (10 - _get_val(telemetry.get("ambulance_iv_flow_rate_ml_min", 40))) / 40),
-        "ev_igbt_temp_C": max(0, (_get_val(telemetry.get("ev_igbt_temp_C", 0)) - 80) / 70),
-        "ev_stator_temp_C": max(0, (_get_val(telemetry.get("ev_stator_temp_C", 0)) - 90) / 70),
-        "ev_rotor_alignment_error": min(1, _get_val(telemetry.get("ev_rotor_alignment_error", 0)) / 0.5),
-        "ev_bearing_vibration": min(1, _get_val(telemetry.get("ev_bearing_vibration", 0)) / 6),
-        "ev_cell_delta_V": min(1, _get_val(telemetry.get("ev_cell_delta_V", 0)) / 0.2),
-        "ev_internal_resistance_mOhm": max(0, (_get_val(telemetry.get("ev_internal_resistance_mOhm", 2)) - 6) / 20),
-        "ev_contactor_temp_C": max(0, (_get_val(telemetry.get("ev_contactor_temp_C", 0)) - 70) / 50),
-    }
+    norm = {}
+    for sensor, default, offset, scale, mode, _, _ in specs:
+        if features and sensor in features:
+            norm[sensor] = _norm_value(mode, features[sensor], offset, scale)
+        elif mode == "flag":
+            norm[sensor] = 1.0 if telemetry.get(sensor) else 0.0
+        else:
+            norm[sensor] = _norm_value(mode, _get_val(telemetry.get(sensor, default)), offset, scale)
+    return norm
 
 def _weights():
-    return {
-        "temperature": 0.15,
-        "vibration": 0.1,
-        "oil_quality_contaminants_V_oil": 0.2,
-        "vibration_rms_A_rms": 0.15,
-        "brake_pad_wear_percent": 0.1,
-        "battery_soh_percent": 0.1,
-        "transmission_fluid_temp_C": 0.15,
-        "fuel_pressure_kPa": 0.05,
-        "ev_battery_temp_C": 0.12,
-        "ev_voltage_stability": 0.1,
-        "petrol_knock_index": 0.12,
-        "petrol_fuel_trim": 0.08,
-        "truck_axle_load_imbalance": 0.1,
-        "truck_brake_air_pressure": 0.12,
-        "ambulance_high_rpm_flag": 0.08,
-        "motorcycle_vibration": 0.08,
-        "motorcycle_lean_angle_deg": 0.05,
-        "motorcycle_regulator_temp_C": 0.06,
-        "motorcycle_methane_ppm": 0.04,
-        "petrol_air_fuel_ratio": 0.06,
-        "petrol_injector_duty_cycle": 0.06,
-        "petrol_cranking_latency_ms": 0.04,
-        "petrol_delta_fuel_pressure_kPa": 0.05,
-        "truck_exhaust_temp_C": 0.08,
-        "truck_thermal_variance": 0.05,
-        "truck_turbo_boost_kPa": 0.05,
-        "ambulance_suspension_load": 0.05,
-        "ambulance_cabin_co2_ppm": 0.05,
-        "ambulance_o2_tank_percent": 0.08,
-        "ambulance_fridge_temp_C": 0.04,
-        "ambulance_suction_pressure_kPa": 0.05,
-        "ambulance_iv_flow_rate_ml_min": 0.04,
-        "ev_igbt_temp_C": 0.06,
-        "ev_stator_temp_C": 0.05,
-        "ev_rotor_alignment_error": 0.05,
-        "ev_bearing_vibration": 0.05,
-        "ev_cell_delta_V": 0.04,
-        "ev_internal_resistance_mOhm": 0.04,
-        "ev_contactor_temp_C": 0.04,
-    }
+    return _WEIGHTS
 
 def _failure_label(sensor: str):
-    mapping = {
-        "oil_quality_contaminants_V_oil": "Engine Seizure Risk due to low oil quality",
-        "vibration_rms_A_rms": "Drivetrain imbalance (RMS vibration high)",
-        "brake_pad_wear_percent": "Brake Fade Risk (pads near limit)",
-        "battery_soh_percent": "Electrical instability (battery SOH low)",
-        "transmission_fluid_temp_C": "Transmission Overheating",
-        "fuel_pressure_kPa": "Fuel delivery instability (rail pressure low)",
-        "temperature": "Engine Overheating",
-        "vibration": "Engine mount / accessory imbalance",
-        "ev_battery_temp_C": "EV Battery Thermal Risk",
-        "ev_voltage_stability": "EV Voltage Instability",
-        "petrol_knock_index": "Engine Knock Detected",
-        "petrol_fuel_trim": "Fuel Trim Out of Range",
-        "truck_axle_load_imbalance": "Axle Load Imbalance",
-        "truck_brake_air_pressure": "Brake Air Pressure Low",
-        "ambulance_high_rpm_flag": "High Duty RPM Pattern",
-        "motorcycle_vibration": "Motorcycle Vibration High",
-        "motorcycle_lean_angle_deg": "Aggressive Lean Angle",
-        "motorcycle_regulator_temp_C": "Regulator Overheating",
-        "motorcycle_methane_ppm": "Methane Detected Near Bike",
-        "petrol_air_fuel_ratio": "Air-Fuel Ratio Out of Range",
-        "petrol_injector_duty_cycle": "Injector Duty Cycle High",
-        "petrol_cranking_latency_ms": "Slow Cranking Detected",
-        "petrol_delta_fuel_pressure_kPa": "Fuel Pressure Delta Abnormal",
-        "truck_exhaust_temp_C": "High Exhaust Temp",
-        "truck_thermal_variance": "Thermal Variance High",
-        "truck_turbo_boost_kPa": "Turbo Boost Over Spec",
-        "ambulance_suspension_load": "Suspension Load High",
-        "ambulance_cabin_co2_ppm": "Cabin CO2 Elevated",
-        "ambulance_o2_tank_percent": "O2 Tank Low",
-        "ambulance_fridge_temp_C": "Fridge Temperature High",
-        "ambulance_suction_pressure_kPa": "Suction Pressure Low",
-        "ambulance_iv_flow_rate_ml_min": "IV Flow Rate Low",
-        "ev_igbt_temp_C": "IGBT Temperature High",
-        "ev_stator_temp_C": "Stator Temperature High",
-        "ev_rotor_alignment_error": "Rotor Alignment Error",
-        "ev_bearing_vibration": "Bearing Vibration High",
-        "ev_cell_delta_V": "Cell Voltage Delta High",
-        "ev_internal_resistance_mOhm": "Internal Resistance Rising",
-        "ev_contactor_temp_C": "Contactor Temperature High",
-    }
-    return mapping.get(sensor, "General Instability Detected")
+    return _FAILURE_LABELS.get(sensor, "General Instability Detected")
+
+
+# --- SCORING PROFILES ---
+# Sensors without a type prefix are fitted to every vehicle.
+_SENSOR_FAMILIES = ("ev", "petrol", "truck", "ambulance", "motorcycle")
+
+def _sensor_family(sensor: str) -> str:
+    prefix = sensor.split("_", 1)[0]
+    return prefix if prefix in _SENSOR_FAMILIES else "common"
+
+
+class ScoringProfile:
+    """
+    Compiled slice of the sensor spec table for one vehicle type or category.
+    Only the sensors the vehicle actually carries are evaluated; the weight
+    vector and per-mode column groups are precomputed once. A profile never
+    changes the score itself: the type multiplier always comes from the
+    sample's own vehicle_type, since a category (e.g. 2W) spans several types.
+    """
+
+    def __init__(self, name: str, families: Optional[Sequence[str]] = None):
+        self.name = name
+        if families is None:
+            self.specs = _SENSOR_SPECS
+        else:
+            allowed = {"common", *families}
+            self.specs = tuple(s for s in _SENSOR_SPECS if _sensor_family(s[0]) in allowed)
+        self.sensors: Tuple[str, ...] = tuple(s[0] for s in self.specs)
+        self.offsets = np.array([s[2] for s in self.specs], dtype=np.float64)
+        self.scales = np.array([s[3] for s in self.specs], dtype=np.float64)
+        self.weights = np.array([s[5] for s in self.specs], dtype=np.float64)
+        self.mode_columns: Dict[str, np.ndarray] = {
+            mode: np.array([j for j, s in enumerate(self.specs) if s[4] == mode], dtype=np.intp)
+            for mode in ("above", "below", "inverse", "ratio", "deviation", "flag")
+        }
+        self.sensor_array = np.array(self.sensors, dtype=object)
+        self.label_array = np.array([s[6] for s in self.specs], dtype=object)
+
+    def __repr__(self) -> str:
+        return f"ScoringProfile({self.name!r}, sensors={len(self.sensors)})"
+
+
+_FULL_PROFILE = ScoringProfile("ALL")
+
+SCORING_PROFILES: Dict[str, ScoringProfile] = {
+    "EV": ScoringProfile("EV", ("ev",)),
+    "Petrol": ScoringProfile("Petrol", ("petrol",)),
+    "Truck": ScoringProfile("Truck", ("truck",)),
+    "Ambulance": ScoringProfile("Ambulance", ("ambulance",)),
+    "Motorcycle": ScoringProfile("Motorcycle", ("motorcycle",)),
+    # vehicles.category values (the "EV" category shares the EV profile above)
+    "2W": ScoringProfile("2W", ("motorcycle", "petrol")),
+    "4W": ScoringProfile("4W", ("petrol",)),
+}
+
+def get_scoring_profile(vehicle_type_or_category: Optional[str]) -> ScoringProfile:
+    """Return the compiled profile for a vehicle type/category, or the full sensor table."""
+    return SCORING_PROFILES.get(vehicle_type_or_category, _FULL_PROFILE)
 
 
-def predict_breakdown_risk(telemetry: Dict[str, Any]) -> Dict[str, Any]:
-    """Return a weighted risk score and dominant failure hypothesis."""
-    norm = _normalize(telemetry)
+def predict_breakdown_risk(
+    telemetry: Dict[str, Any],
+    profile: Optional[ScoringProfile] = None,
+    features: Optional[Dict[str, float]] = None,
+) -> Dict[str, Any]:
+    """
+    Return a weighted risk score and dominant failure hypothesis.
+    With a profile, only that profile's sensors are evaluated.
+    `features` (e.g. VehicleFeatureStore.projected_values) are scored in place
+    of the instantaneous reading for the sensors they cover.
+    """
+    profile = profile or _FULL_PROFILE
+    norm = _normalize(telemetry, profile.specs, features)
     weight_map = _weights()
 
-    risk_score = sum(norm[k] * weight_map[k] for k in weight_map)
+    # Plain left-to-right adds: sum() compensates on Python 3.12+, NumPy's batch path does not
+    risk_score = 0.0
+    for k in norm:
+        risk_score += norm[k] * weight_map[k]
     risk_score = min(1.0, risk_score)
     vehicle_type = telemetry.get("vehicle_type")
     
     # Adjust risk multiplier based on vehicle type
-    if vehicle_type == "EV":
-        risk_score *= 1.05
-    elif vehicle_type == "Petrol":
-        risk_score *= 1.02
-    elif vehicle_type == "Truck":
-        risk_score *= 1.07
-    elif vehicle_type == "Ambulance":
-        risk_score *= 1.1
-    elif vehicle_type == "Motorcycle":
-        risk_score *= 1.03
+    if vehicle_type in _TYPE_MULTIPLIERS:
+        risk_score *= _TYPE_MULTIPLIERS[vehicle_type]
 
     # Find dominant sensor
     dominant_sensor = max(norm.items(), key=lambda kv: kv[1])[0] if norm else "unknown"
@@ -180,4 +210,120 @@ def predict_breakdown_risk(telemetry: Dict[str, Any]) -> Dict[str, Any]:
         "predicted_failure_type": predicted_failure,
         "root_cause_sensor": dominant_sensor,
         "current_sensor_value": current_value,
-    }
\ No newline at end of file
+    }
+
+
+# --- BATCH SCORING ---
+def telemetry_matrix(samples: Sequence[Dict[str, Any]], profile: Optional[ScoringProfile] = None) -> np.ndarray:
+    """Pack telemetry dicts into an (n, len(profile.sensors)) float matrix in spec order."""
+    specs = (profile or _FULL_PROFILE).specs
+    matrix = np.empty((len(samples), len(specs)), dtype=np.float64)
+    for j, (sensor, default, _, _, mode, _, _) in enumerate(specs):
+        if mode == "flag":
+            matrix[:, j] = [1.0 if t.get(sensor) else 0.0 for t in samples]
+        else:
+            matrix[:, j] = [_get_val(t.get(sensor, default)) for t in samples]
+    return matrix
+
+
+def fill_telemetry_row(telemetry: Dict[str, Any], out: np.ndarray, profile: Optional[ScoringProfile] = None) -> np.ndarray:
+    """Write one sample's sensor values into a preallocated row (no per-call allocation)."""
+    for j, (sensor, default, _, _, mode, _, _) in enumerate((profile or _FULL_PROFILE).specs):
+        if mode == "flag":
+            out[j] = 1.0 if telemetry.get(sensor) else 0.0
+        else:
+            out[j] = _get_val(telemetry.get(sensor, default))
+    return out
+
+
+def _normalize_matrix(matrix: np.ndarray, profile: ScoringProfile) -> np.ndarray:
+    # Same arithmetic as _norm_value, column group by column group. fmax/fmin
+    # mirror Python's max(0, nan) == 0 and min(1, nan) == 1.
+    offsets, scales = profile.offsets, profile.scales
+    norm = np.empty_like(matrix)
+    cols = profile.mode_columns["above"]
+    norm[:, cols] = np.fmax(0, (matrix[:, cols] - offsets[cols]) / scales[cols])
+    cols = profile.mode_columns["below"]
+    norm[:, cols] = np.fmax(0, (offsets[cols] - matrix[:, cols]) / scales[cols])
+    cols = profile.mode_columns["inverse"]
+    norm[:, cols] = np.fmax(0, 1 - matrix[:, cols] / scales[cols])
+    cols = profile.mode_columns["ratio"]
+    norm[:, cols] = np.fmin(1, matrix[:, cols] / scales[cols])
+    cols = profile.mode_columns["deviation"]
+    norm[:, cols] = np.fmin(1, np.abs(matrix[:, cols] - offsets[cols]) / scales[cols])
+    cols = profile.mode_columns["flag"]
+    norm[:, cols] = (matrix[:, cols] != 0).astype(np.float64)
+    return norm
+
+
+def predict_breakdown_risk_batch(
+    samples: Union[np.ndarray, Sequence[Dict[str, Any]]],
+    vehicle_types: Optional[Sequence[Optional[str]]] = None,
+    vehicle_ids: Optional[Sequence[str]] = None,
+    profile: Optional[ScoringProfile] = None,
+    features: Optional[Sequence[Optional[Dict[str, float]]]] = None,
+) -> Dict[str, Any]:
+    """
+    Score many vehicles at once.
+
+    `samples` is either a list of telemetry dicts or a columnar matrix whose
+    columns follow `profile.sensors` (SENSOR_NAMES by default). `features`,
+    one dict (or None) per sample, replaces readings as in
+    predict_breakdown_risk(features=...). Returns parallel arrays whose
+    entries match predict_breakdown_risk() for the same sample, profile and
+    features exactly.
+    """
+    profile = profile or _FULL_PROFILE
+    width = len(profile.specs)
+    if isinstance(samples, np.ndarray):
+        matrix = np.asarray(samples, dtype=np.float64)
+        if matrix.ndim != 2 or matrix.shape[1] != width:
+            raise ValueError(f"Expected an (n, {width}) telemetry matrix for profile {profile.name}, got {matrix.shape}")
+        n = matrix.shape[0]
+        records = None
+    else:
+        records = list(samples)
+        matrix = telemetry_matrix(records, profile)
+        n = len(records)
+        if vehicle_types is None:
+            vehicle_types = [t.get("vehicle_type") for t in records]
+        if vehicle_ids is None:
+            vehicle_ids = [t.get("vehicle_id", t.get("chassis_number", "UNKNOWN")) for t in records]
+
+    scored = matrix
+    if features is not None:
+        # Copy: current_sensor_value still reports the raw reading
+        scored = matrix.copy()
+        for i, feats in enumerate(features):
+            if feats:
+                for j, sensor in enumerate(profile.sensors):
+                    if sensor in feats:
+                        scored[i, j] = feats[sensor]
+
+    norm = _normalize_matrix(scored, profile)
+
+    # Accumulate column by column so the additions match the scalar path's loop exactly
+    risk = np.zeros(n, dtype=np.float64)
+    for j in range(width):
+        risk += norm[:, j] * profile.weights[j]
+    risk = np.fmin(1.0, risk)
+    if vehicle_types is not None:
+        risk *= np.array([_TYPE_MULTIPLIERS.get(t, 1.0) for t in vehicle_types], dtype=np.float64)
+
+    dominant = np.argmax(norm, axis=1)
+    if records is None:
+        current_values = matrix[np.arange(n), dominant]
+    else:
+        current_values = np.array(
+            [_get_val(t.get(profile.sensors[j])) for t, j in zip(records, dominant.tolist())],
+            dtype=np.float64,
+        )
+
+    return {
+        "vehicle_ids": list(vehicle_ids) if vehicle_ids is not None else ["UNKNOWN"] * n,
+        # Python's round() keeps results identical to the scalar path (np.round is not correctly rounded)
+        "risk_scores": np.array([round(r, 3) for r in risk.tolist()], dtype=np.float64),
+        "root_cause_sensors": profile.sensor_array[dominant],
+        "predicted_failure_types": profile.label_array[dominant],
+        "current_sensor_values": current_values,
+    }
@@ -1,10 +1,70 @@
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+import asyncio
+import base64
+import binascii
+import functools
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import false, func, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import joinedload
-from database import Dealer, ServiceBooking, User, Vehicle, ensure_seed_data, init_db, session_scope, verify_password
+from database import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    Appointment,
+    Dealer,
+    ServiceBooking,
+    User,
+    Vehicle,
+    engine,
+    ensure_seed_data,
+    init_db,
+    session_scope,
+)
+from dealer_cache import DealerSnapshotCache
+from wait_estimator import ACTIVE_STATUSES, DONE_STATUSES
 
 init_db()
 
+# Dedicated threads for blocking DB calls from async handlers. Sized to the
+# pool so calls queue here instead of blocking on pool checkout, and kept
+# apart from the default executor used by the telemetry writer.
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_POOL_SIZE + DB_MAX_OVERFLOW, thread_name_prefix="robust-db")
+
+# run_db calls submitted and not yet finished; only touched on the event loop thread
+_DB_IN_FLIGHT = 0
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking robust_db function without stalling the event loop."""
+    global _DB_IN_FLIGHT
+    loop = asyncio.get_running_loop()
+    _DB_IN_FLIGHT += 1
+    try:
+        return await loop.run_in_executor(DB_EXECUTOR, functools.partial(fn, *args, **kwargs))
+    finally:
+        _DB_IN_FLIGHT -= 1
+
+def db_stats() -> Dict[str, Any]:
+    workers = DB_POOL_SIZE + DB_MAX_OVERFLOW
+    return {
+        **engine.pool.stats(),
+        "executor_in_flight": _DB_IN_FLIGHT,
+        # Calls beyond the worker count are waiting for a thread
+        "executor_queue": max(0, _DB_IN_FLIGHT - workers),
+        "dealer_cache": DEALER_SNAPSHOTS.stats(),
+    }
+
+DEALER_SNAPSHOTS = DealerSnapshotCache(max_dealers=int(os.getenv("DEALER_CACHE_SIZE", "1024")))
+
+# Called as fn(center_id, chassis) after a booking made outside the API
+# handlers (agent tools) commits; may run on any thread.
+_BOOKING_LISTENERS: List[Callable[[str, str], None]] = []
+
+def add_booking_listener(fn: Callable[[str, str], None]) -> None:
+    _BOOKING_LISTENERS.append(fn)
+
 def _serialize_dealer(dealer: Dealer) -> Dict:
     # 1. Inventory (Unsold)
     inventory = []
@@ -52,34 +112,28 @@ def _serialize_owner(user: User) -> Dict:
         "vehicles": vehicles
     }
 
-def authenticate_dealer(username, password) -> Optional[Dict]:
+def get_login_record(username) -> Optional[Dict]:
+    """
+    Credentials and profile keys for /login in one query. Password checking
+    happens afterwards on the bcrypt pool, so no DB thread or pooled
+    connection is held while hashing.
+    """
     with session_scope() as session:
-        user = session.query(User).filter(User.username == username).first()
-        if not user or not verify_password(password, user.password_hash): return None
-        
-        # [FIX] Enforce Role Check
-        if user.role != "ADMIN":  # In populate_data.py, HERO_DLR is 'ADMIN'
-            return None
-        
-        dealer = session.query(Dealer).filter(Dealer.user_id == user.user_id).options(
-            joinedload(Dealer.vehicles).joinedload(Vehicle.owner),
-            joinedload(Dealer.user)
-        ).first()
-        
-        if not dealer: return None
-        return _serialize_dealer(dealer)
+        row = session.query(User.user_id, User.role, User.password_hash, Dealer.dealer_id) \
+            .outerjoin(Dealer, Dealer.user_id == User.user_id) \
+            .filter(User.username == username).first()
+        if not row: return None
+        return {
+            "user_id": str(row.user_id),
+            "role": row.role,  # In populate_data.py, HERO_DLR is 'ADMIN' and rahul is 'OWNER'
+            "password_hash": row.password_hash,
+            "dealer_id": str(row.dealer_id) if row.dealer_id else None,
+        }
 
-def authenticate_owner(username, password) -> Optional[Dict]:
+def get_owner_profile(user_id) -> Optional[Dict]:
     with session_scope() as session:
-        user = session.query(User).filter(User.username == username).first()
-        if not user or not verify_password(password, user.password_hash): return None
-        
-        # [FIX] Enforce Role Check
-        if user.role != "OWNER": # In populate_data.py, rahul is 'OWNER'
-            return None
-        
-        # Ensure vehicles are loaded
-        session.query(Vehicle).filter(Vehicle.owner_id == user.user_id).all()
+        user = session.query(User).filter(User.user_id == user_id).options(joinedload(User.vehicles)).first()
+        if not user: return None
         return _serialize_owner(user)
 
 def add_stock(dealer_id_or_user, chassis_number, model):
@@ -107,7 +161,9 @@ def add_stock(dealer_id_or_user, chassis_number, model):
             is_active=True
         )
         session.add(v)
-        return True
+    # Committed; patch the cached snapshot instead of reloading the inventory
+    DEALER_SNAPSHOTS.add_inventory(dealer_id_or_user, {"chassis_number": chassis_number, "model": model, "status": "Available"})
+    return True
 
 def assign_vehicle(dealer_id, chassis_number, target_username):
     with session_scope() as session:
@@ -119,43 +175,301 @@ def assign_vehicle(dealer_id, chassis_number, target_username):
         
         v.owner_id = target.user_id
         v.sale_date = datetime.utcnow()
-        return True, "Assigned"
+        sold = {
+            "chassis_number": v.chassis_number,
+            "model": v.model,
+            "owner_username": target.username,
+            "sale_date": str(v.sale_date.date()),
+        }
+    DEALER_SNAPSHOTS.mark_sold(dealer_id, sold)
+    return True, "Assigned"
+
+# Rows per multi-row INSERT / IN (...) lookup in the bulk dealer operations
+BULK_CHUNK_ROWS = 1000
+
+def _chunks(items: List[Any], size: int = BULK_CHUNK_ROWS):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _bulk_error(index: int, chassis_number: Any, error: str) -> Dict:
+    return {"index": index, "chassis_number": chassis_number, "error": error}
+
+def _bulk_field(row: Dict, key: str) -> str:
+    value = row.get(key) if isinstance(row, dict) else None
+    return str(value).strip() if value is not None else ""
+
+def add_stock_bulk(dealer_id, items: List[Dict]) -> Optional[Tuple[List[Dict], List[Dict]]]:
+    """
+    Add many {"chassis_number", "model"} rows to a dealer's inventory in one
+    transaction: one dealer lookup, one IN (...) duplicate check and one
+    multi-row INSERT per BULK_CHUNK_ROWS. Returns (added inventory rows,
+    per-row errors), or None if the dealer does not exist.
+    """
+    errors, candidates, seen = [], [], set()
+    for i, row in enumerate(items):
+        chassis, model = _bulk_field(row, "chassis_number"), _bulk_field(row, "model")
+        if not chassis or not model:
+            errors.append(_bulk_error(i, chassis or None, "chassis_number and model are required"))
+        elif len(chassis) > 50 or len(model) > 50:
+            errors.append(_bulk_error(i, chassis, "chassis_number and model must be at most 50 characters"))
+        elif chassis in seen:
+            errors.append(_bulk_error(i, chassis, "Duplicate chassis_number in batch"))
+        else:
+            seen.add(chassis)
+            candidates.append((i, chassis, model))
 
-def get_dealer_snapshot(dealer_id):
     with session_scope() as session:
-        dealer = session.query(Dealer).filter(Dealer.dealer_id == dealer_id).first()
+        dealer = session.query(Dealer.brand).filter(Dealer.dealer_id == dealer_id).first()
+        if not dealer: return None
+        # Brand exclusivity, as in add_stock
+        vehicle_make = dealer.brand if dealer.brand else "Generic"
+
+        existing = set()
+        for chunk in _chunks([chassis for _, chassis, _ in candidates]):
+            existing.update(c for (c,) in session.query(Vehicle.chassis_number).filter(Vehicle.chassis_number.in_(chunk)))
+        rows = []
+        for i, chassis, model in candidates:
+            if chassis in existing:
+                errors.append(_bulk_error(i, chassis, "Vehicle already exists"))
+                continue
+            rows.append({
+                "chassis_number": chassis,
+                "dealer_id": dealer_id,
+                "model": model,
+                "category": "4W",
+                "make": vehicle_make,
+                "manufacturing_year": 2025,
+                "is_active": True,
+            })
+
+        # ON CONFLICT covers rows inserted by a concurrent request since the check above
+        inserted = set()
+        for chunk in _chunks(rows):
+            stmt = pg_insert(Vehicle).values(chunk) \
+                .on_conflict_do_nothing(index_elements=[Vehicle.chassis_number]) \
+                .returning(Vehicle.chassis_number)
+            inserted.update(session.scalars(stmt))
+
+    added = []
+    for i, chassis, model in candidates:
+        if chassis in inserted:
+            added.append({"chassis_number": chassis, "model": model, "status": "Available"})
+        elif chassis not in existing:
+            errors.append(_bulk_error(i, chassis, "Vehicle already exists"))
+    if added:
+        DEALER_SNAPSHOTS.add_inventory(dealer_id, *added)
+    errors.sort(key=lambda e: e["index"])
+    return added, errors
+
+def assign_vehicles_bulk(dealer_id, assignments: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Assign many {"chassis_number", "target_username"} rows in one
+    transaction: one IN (...) lookup each for users and the dealer's vehicles
+    and a single executemany UPDATE. Returns (sold rows, per-row errors).
+    """
+    errors, candidates, seen = [], [], set()
+    for i, row in enumerate(assignments):
+        chassis, username = _bulk_field(row, "chassis_number"), _bulk_field(row, "target_username")
+        if not chassis or not username:
+            errors.append(_bulk_error(i, chassis or None, "chassis_number and target_username are required"))
+        elif chassis in seen:
+            errors.append(_bulk_error(i, chassis, "Duplicate chassis_number in batch"))
+        else:
+            seen.add(chassis)
+            candidates.append((i, chassis, username))
+
+    sold = []
+    with session_scope() as session:
+        users: Dict[str, Any] = {}
+        for chunk in _chunks(list({username for _, _, username in candidates})):
+            users.update(session.query(User.username, User.user_id).filter(User.username.in_(chunk)))
+        models: Dict[str, str] = {}
+        for chunk in _chunks([chassis for _, chassis, _ in candidates]):
+            models.update(
+                session.query(Vehicle.chassis_number, Vehicle.model)
+                .filter(Vehicle.dealer_id == dealer_id, Vehicle.chassis_number.in_(chunk))
+            )
+
+        sale_date = datetime.utcnow()
+        updates = []
+        for i, chassis, username in candidates:
+            if username not in users:
+                errors.append(_bulk_error(i, chassis, "User not found"))
+            elif chassis not in models:
+                errors.append(_bulk_error(i, chassis, "Vehicle not found"))
+            else:
+                updates.append({"chassis_number": chassis, "owner_id": users[username], "sale_date": sale_date})
+                sold.append({
+                    "chassis_number": chassis,
+                    "model": models[chassis],
+                    "owner_username": username,
+                    "sale_date": str(sale_date.date()),
+                })
+        if updates:
+            # ORM bulk UPDATE by primary key: one executemany, no per-row object loads
+            session.execute(update(Vehicle), updates)
+
+    if sold:
+        DEALER_SNAPSHOTS.mark_sold(dealer_id, *sold)
+    errors.sort(key=lambda e: e["index"])
+    return sold, errors
+
+def _load_dealer_snapshot(dealer_id):
+    with session_scope() as session:
+        # One round trip for dealer, user, vehicles and owners instead of N+1 lazy loads
+        dealer = session.query(Dealer).filter(Dealer.dealer_id == dealer_id).options(
+            joinedload(Dealer.vehicles).joinedload(Vehicle.owner),
+            joinedload(Dealer.user)
+        ).first()
         if dealer: return _serialize_dealer(dealer)
         return None
 
+def get_dealer_snapshot(dealer_id):
+    return DEALER_SNAPSHOTS.get(dealer_id, lambda: _load_dealer_snapshot(dealer_id))
+
+def _add_service_booking(session, ticket_id, chassis, issue, center_id, center_name) -> None:
+    vehicle = session.query(Vehicle.owner_id, Vehicle.dealer_id).filter_by(chassis_number=chassis).first()
+    session.add(ServiceBooking(
+        ticket_id=ticket_id,
+        chassis_number=chassis,
+        owner_id=vehicle.owner_id if vehicle else None,
+        dealer_id=vehicle.dealer_id if vehicle else None,
+        service_center_id=center_id,
+        service_center_name=center_name,
+        issue=issue,
+    ))
+
 def record_service_booking(ticket_id, chassis, owner_name, issue, center_id, center_name):
     with session_scope() as session:
-        vehicle = session.query(Vehicle).filter_by(chassis_number=chassis).first()
-        booking = ServiceBooking(
-            ticket_id=ticket_id,
-            chassis_number=chassis,
-            owner_id=vehicle.owner_id if vehicle else None,
-            dealer_id=vehicle.dealer_id if vehicle else None,
-            service_center_id=center_id,
-            service_center_name=center_name,
-            issue=issue,
-        )
-        session.add(booking)
+        _add_service_booking(session, ticket_id, chassis, issue, center_id, center_name)
         return True
 
-def list_service_bookings(center_id=None):
+def reserve_appointment(ticket_id, chassis, issue, center_id, center_name, slot_time) -> Optional[Dict]:
+    """
+    Claim a free slot at `center_id` / `slot_time` and open its service ticket
+    in one transaction. The claim is a single UPDATE ... RETURNING over a
+    FOR UPDATE SKIP LOCKED pick, so concurrent callers take different bay
+    rows (or get None) instead of double-booking or queueing on one row.
+    """
     with session_scope() as session:
-        query = session.query(ServiceBooking).options(joinedload(ServiceBooking.vehicle), joinedload(ServiceBooking.owner))
+        free_slot = select(Appointment.appt_id).where(
+            Appointment.service_center_id == center_id,
+            Appointment.slot_time == slot_time,
+            Appointment.is_booked == false(),
+        ).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+        claimed = session.execute(
+            update(Appointment)
+            .where(Appointment.appt_id == free_slot, Appointment.is_booked == false())
+            .values(is_booked=True, booked_chassis=chassis, ticket_id=ticket_id)
+            .returning(Appointment.appt_id, Appointment.slot_time)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if not claimed: return None
+        _add_service_booking(session, ticket_id, chassis, issue, center_id, center_name)
+        reserved = {"appt_id": claimed.appt_id, "slot_time": claimed.slot_time, "ticket_id": ticket_id}
+    for fn in _BOOKING_LISTENERS:
+        try:
+            fn(center_id, chassis)
+        except Exception as e:
+            print(f"[robust_db] booking listener failed: {e}")
+    return reserved
+
+def open_appointment_slots(center_id=None, limit=4) -> List[Dict]:
+    """Earliest free slot times with the number of free bays, per center."""
+    with session_scope() as session:
+        query = session.query(Appointment.service_center_id, Appointment.slot_time, func.count()) \
+            .filter(Appointment.is_booked == false())
+        if center_id: query = query.filter(Appointment.service_center_id == center_id)
+        rows = query.group_by(Appointment.service_center_id, Appointment.slot_time) \
+            .order_by(Appointment.slot_time, Appointment.service_center_id).limit(limit)
+        return [{"center_id": c, "slot_time": t, "free_bays": n} for c, t, n in rows]
+
+def _serialize_booking(b: ServiceBooking) -> Dict:
+    return {
+        "ticket_id": b.ticket_id,
+        "vehicle_id": b.chassis_number,
+        "owner_name": b.owner.full_name if b.owner else (b.vehicle.owner.full_name if b.vehicle and b.vehicle.owner else "Unknown"),
+        "issue": b.issue,
+        "service_center": b.service_center_name,
+        "center_id": b.service_center_id,
+        "created_at": b.created_at.isoformat(),
+        "status": b.status,
+    }
+
+def encode_booking_cursor(created_at: datetime, booking_id) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{booking_id}".encode()).decode()
+
+def decode_booking_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Raises ValueError for malformed cursors."""
+    try:
+        created_at, booking_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError("invalid cursor") from e
+    return datetime.fromisoformat(created_at), uuid.UUID(booking_id)
+
+def list_service_bookings(center_id=None, status=None, limit=100, cursor=None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of bookings, newest first, and the cursor for the next page
+    (None on the last page). Keyset pagination on (created_at, booking_id),
+    served by the idx_bookings_* indexes.
+    """
+    with session_scope() as session:
+        query = session.query(ServiceBooking).options(
+            joinedload(ServiceBooking.vehicle).joinedload(Vehicle.owner), joinedload(ServiceBooking.owner)
+        )
         if center_id: query = query.filter(ServiceBooking.service_center_id == center_id)
-        bookings = query.order_by(ServiceBooking.created_at.desc()).all()
-        results = []
-        for b in bookings:
-            results.append({
-                "ticket_id": b.ticket_id,
-                "vehicle_id": b.chassis_number,
-                "owner_name": b.owner.full_name if b.owner else (b.vehicle.owner.full_name if b.vehicle and b.vehicle.owner else "Unknown"),
-                "issue": b.issue,
-                "service_center": b.service_center_name,
-                "center_id": b.service_center_id,
-                "created_at": b.created_at.isoformat(),
-            })
-        return results
\ No newline at end of file
+        if status: query = query.filter(ServiceBooking.status == status)
+        if cursor:
+            created_at, booking_id = decode_booking_cursor(cursor)
+            query = query.filter(tuple_(ServiceBooking.created_at, ServiceBooking.booking_id) < tuple_(created_at, booking_id))
+        bookings = query.order_by(ServiceBooking.created_at.desc(), ServiceBooking.booking_id.desc()).limit(limit + 1).all()
+        page = bookings[:limit]
+        next_cursor = encode_booking_cursor(page[-1].created_at, page[-1].booking_id) if len(bookings) > limit else None
+        return [_serialize_booking(b) for b in page], next_cursor
+
+def update_booking_status(ticket_id, status) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """Set a booking's status; returns (service_center_id, previous status) or None if unknown."""
+    with session_scope() as session:
+        booking = session.query(ServiceBooking).filter_by(ticket_id=ticket_id).first()
+        if not booking: return None
+        previous = booking.status
+        booking.status = status
+        if status in DONE_STATUSES and previous not in DONE_STATUSES:
+            booking.closed_at = datetime.utcnow()
+        return booking.service_center_id, previous
+
+def service_center_load(window_hours: float = 24.0) -> Tuple[Dict[str, int], Dict[str, List[float]]]:
+    """Open tickets per center and recent completion times (epoch s), for the wait-time estimator."""
+    with session_scope() as session:
+        open_counts = dict(
+            session.query(ServiceBooking.service_center_id, func.count())
+            .filter(ServiceBooking.status.in_(ACTIVE_STATUSES))
+            .group_by(ServiceBooking.service_center_id)
+        )
+        completions: Dict[str, List[float]] = {}
+        since = datetime.utcnow() - timedelta(hours=window_hours)
+        rows = session.query(ServiceBooking.service_center_id, ServiceBooking.closed_at) \
+            .filter(ServiceBooking.closed_at >= since)
+        for center_id, closed_at in rows:
+            completions.setdefault(center_id, []).append(closed_at.replace(tzinfo=timezone.utc).timestamp())
+        return open_counts, completions
+
+
+def vehicle_alert_routing(vehicle_ids: List[str]) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    vehicle -> {dealer_id, service_center_id of its latest booking} for the
+    given vehicles (those with active alerts), for alert stream filters.
+    """
+    routing: Dict[str, Dict[str, Optional[str]]] = {}
+    with session_scope() as session:
+        for chunk in _chunks(list(vehicle_ids)):
+            for chassis, dealer_id in session.query(Vehicle.chassis_number, Vehicle.dealer_id) \
+                    .filter(Vehicle.chassis_number.in_(chunk)):
+                routing[chassis] = {"dealer_id": str(dealer_id) if dealer_id else None, "service_center_id": None}
+            bookings = session.query(ServiceBooking.chassis_number, ServiceBooking.service_center_id) \
+                .filter(ServiceBooking.chassis_number.in_(chunk)) \
+                .order_by(ServiceBooking.created_at)
+            for chassis, center_id in bookings:
+                if chassis in routing and center_id:
+                    routing[chassis]["service_center_id"] = center_id
+    return routing
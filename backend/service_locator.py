@@ -0,0 +1,84 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+# Upper bound on (locations x centers) distances materialized at once
+_CHUNK_CELLS = 4_000_000
+
+
+def _unit_vectors(lat: Any, lon: Any) -> np.ndarray:
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)), axis=-1)
+
+
+def _dot_to_km(dot: np.ndarray) -> np.ndarray:
+    # Great-circle distance from the chord length between unit vectors
+    chord = np.sqrt(np.clip(2.0 - 2.0 * dot, 0.0, 4.0))
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(chord / 2.0)
+
+
+class ServiceCenterIndex:
+    """
+    Service center catalog on the unit sphere.
+
+    Centers are stored as an (n, 3) array of unit vectors, so distances from
+    many locations to every center are one matrix product; k-nearest uses
+    argpartition instead of a full sort. Results match haversine distances.
+    """
+
+    def __init__(self, centers: Sequence[Dict[str, Any]]):
+        self.centers: List[Dict[str, Any]] = list(centers)
+        self._by_id = {c["id"]: i for i, c in enumerate(self.centers)}
+        self._xyz = _unit_vectors([c["lat"] for c in self.centers], [c["lon"] for c in self.centers]).reshape(-1, 3)
+
+    def __len__(self) -> int:
+        return len(self.centers)
+
+    def get(self, center_id: str) -> Optional[Dict[str, Any]]:
+        i = self._by_id.get(center_id)
+        return None if i is None else self.centers[i]
+
+    def position(self, center_id: str) -> Optional[int]:
+        return self._by_id.get(center_id)
+
+    def distance_matrix(self, lats: Sequence[float], lons: Sequence[float]) -> np.ndarray:
+        """(locations, centers) distances in km."""
+        return _dot_to_km(_unit_vectors(lats, lons).reshape(-1, 3) @ self._xyz.T)
+
+    def nearest_batch(
+        self, lats: Sequence[float], lons: Sequence[float], k: int = 1
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and distances (km) of the k nearest centers for every location, nearest first."""
+        points = _unit_vectors(lats, lons).reshape(-1, 3)
+        k = max(1, min(k, len(self.centers)))
+        idx = np.empty((len(points), k), dtype=np.intp)
+        dist = np.empty((len(points), k))
+        step = max(1, _CHUNK_CELLS // max(len(self.centers), 1))
+        for start in range(0, len(points), step):
+            # Largest dot product == nearest; negate so argpartition picks the k smallest
+            neg_dot = -(points[start:start + step] @ self._xyz.T)
+            part = np.argpartition(neg_dot, k - 1, axis=1)[:, :k] if k < len(self.centers) else \
+                np.broadcast_to(np.arange(k), (len(neg_dot), k))
+            part_dot = np.take_along_axis(neg_dot, part, axis=1)
+            order = np.argsort(part_dot, axis=1)
+            idx[start:start + step] = np.take_along_axis(part, order, axis=1)
+            dist[start:start + step] = _dot_to_km(-np.take_along_axis(part_dot, order, axis=1))
+        return idx, dist
+
+    def nearest(self, lat: float, lon: float, k: Optional[int] = None) -> List[Tuple[Dict[str, Any], float]]:
+        if not self.centers:
+            return []
+        idx, dist = self.nearest_batch([lat], [lon], k or len(self.centers))
+        return [(self.centers[i], float(d)) for i, d in zip(idx[0], dist[0])]
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[Dict[str, Any], float]]:
+        """Centers within `radius_km`, nearest first."""
+        if not self.centers:
+            return []
+        dist = self.distance_matrix([lat], [lon])[0]
+        hits = np.flatnonzero(dist <= radius_km)
+        hits = hits[np.argsort(dist[hits])]
+        return [(self.centers[i], float(dist[i])) for i in hits]
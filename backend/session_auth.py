@@ -0,0 +1,117 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from database import verify_password
+
+# bcrypt threads; the C extension releases the GIL, so these use real cores
+PASSWORD_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+# Logins allowed to wait for a bcrypt thread before new ones are turned away
+PASSWORD_MAX_PENDING = 256
+SESSION_TTL_SECONDS = 12 * 3600
+
+
+class LoginThrottled(Exception):
+    """Too many logins already waiting on password verification."""
+
+
+class PasswordVerifier:
+    """
+    bcrypt checks on a small dedicated pool, kept off the event loop and the
+    DB executor. At most `workers` hashes run at once; up to `max_pending`
+    more wait on a semaphore, and anything beyond that is rejected straight
+    away so a login storm queues briefly instead of eating every core.
+    """
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, max_pending: int = PASSWORD_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(workers)
+        self.pending = 0
+        self.verified = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.hash_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    async def verify(self, plain: str, hashed: str) -> bool:
+        """Raises LoginThrottled when the queue is full."""
+        if self.pending >= self.workers + self.max_pending:
+            self.throttled += 1
+            raise LoginThrottled()
+        self.pending += 1
+        queued = time.perf_counter()
+        try:
+            async with self._slots:
+                started = time.perf_counter()
+                self.wait_ms_max = max(self.wait_ms_max, (started - queued) * 1000)
+                loop = asyncio.get_running_loop()
+                ok = await loop.run_in_executor(self._executor, verify_password, plain, hashed)
+                self.hash_ms_total += (time.perf_counter() - started) * 1000
+        finally:
+            self.pending -= 1
+        if ok:
+            self.verified += 1
+        else:
+            self.rejected += 1
+        return ok
+
+    def stats(self) -> Dict[str, Any]:
+        checks = self.verified + self.rejected
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "avg_hash_ms": round(self.hash_ms_total / checks, 2) if checks else 0.0,
+            "max_wait_ms": round(self.wait_ms_max, 2),
+        }
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class SessionTokens:
+    """
+    Stateless HMAC-SHA256 signed session tokens: base64url(claims).base64url(mac).
+    Verifying one is a hash over a few hundred bytes, so requests carrying a
+    token skip bcrypt and the credential lookup entirely.
+    """
+
+    def __init__(self, secret: bytes, ttl_seconds: int = SESSION_TTL_SECONDS):
+        self._secret = secret
+        self.ttl_seconds = ttl_seconds
+
+    def _sign(self, payload: str) -> str:
+        return _b64(hmac.new(self._secret, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, claims: Dict[str, Any]) -> Dict[str, Any]:
+        expires_at = int(time.time()) + self.ttl_seconds
+        payload = _b64(json.dumps({**claims, "exp": expires_at}, separators=(",", ":")).encode())
+        return {"token": f"{payload}.{self._sign(payload)}", "expires_at": expires_at}
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """Claims of a valid, unexpired token, else None."""
+        payload, _, mac = token.partition(".")
+        if not payload or not hmac.compare_digest(mac.encode(), self._sign(payload).encode()):
+            return None
+        try:
+            claims = json.loads(_unb64(payload))
+        except ValueError:
+            return None
+        if not isinstance(claims, dict) or claims.get("exp", 0) < time.time():
+            return None
+        return claims
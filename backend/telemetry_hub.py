@@ -0,0 +1,449 @@
+import asyncio
+import json
+import math
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from access_control import apply_access_control
+
+try:
+    import msgpack
+except ImportError:  # compact mode falls back to minified JSON
+    msgpack = None
+
+# A full (key) frame is forced after this many consecutive deltas per vehicle
+KEYFRAME_INTERVAL = 20
+
+# Slow-consumer policies: what happens when a connection's send queue is full
+DROP_OLDEST = "drop_oldest"
+KEEP_LATEST = "keep_latest"
+DISCONNECT = "disconnect"
+BACKPRESSURE_POLICIES = (DROP_OLDEST, KEEP_LATEST, DISCONNECT)
+
+# Slowest per-viewer update period accepted, in seconds
+MAX_CADENCE_S = 300.0
+
+
+def _pack(obj: Any) -> Union[bytes, str]:
+    if msgpack is not None:
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def _pack_array(items: List[Union[bytes, str]]) -> Union[bytes, str]:
+    # Splice already-encoded items instead of re-encoding them
+    if msgpack is not None:
+        return msgpack.Packer().pack_array_header(len(items)) + b"".join(items)
+    return "[" + ",".join(items) + "]"
+
+
+class TelemetryFrame:
+    """One processed tick for a vehicle, encoded at most once per role and format."""
+
+    __slots__ = ("vehicle_id", "payload", "seq", "prev", "_views", "_encoded", "_compact")
+
+    def __init__(self, vehicle_id: str, payload: Dict[str, Any], seq: int = 1, prev: Optional["TelemetryFrame"] = None):
+        self.vehicle_id = vehicle_id
+        self.payload = payload
+        self.seq = seq
+        # Previous frame for the same vehicle, kept only until the next one is published
+        self.prev = prev
+        self._views: Dict[str, Dict[str, Any]] = {}
+        self._encoded: Dict[str, str] = {}
+        self._compact: Dict[Tuple[str, bool], Union[bytes, str]] = {}
+
+    def view(self, role: str) -> Dict[str, Any]:
+        view = self._views.get(role)
+        if view is None:
+            view = self._views[role] = {**self.payload, "ueba": apply_access_control(role, self.payload.get("ueba", {}))}
+        return view
+
+    def text_for(self, role: str) -> str:
+        text = self._encoded.get(role)
+        if text is None:
+            text = self._encoded[role] = json.dumps(self.view(role))
+        return text
+
+    def compact(self, role: str, keyframe: bool) -> Union[bytes, str]:
+        """
+        Compact-mode message: {"t": "k"|"d", "v": vehicle_id, "s": seq, "d": fields, "r": removed}.
+        Deltas carry only the top-level fields that changed since `prev`.
+        """
+        keyframe = keyframe or self.prev is None
+        cached = self._compact.get((role, keyframe))
+        if cached is not None:
+            return cached
+        cur = self.view(role)
+        if keyframe:
+            msg = {"t": "k", "v": self.vehicle_id, "s": self.seq, "d": cur}
+        else:
+            old = self.prev.view(role)
+            msg = {
+                "t": "d",
+                "v": self.vehicle_id,
+                "s": self.seq,
+                "d": {k: v for k, v in cur.items() if k not in old or old[k] != v},
+                "r": [k for k in old if k not in cur],
+            }
+        packed = self._compact[(role, keyframe)] = _pack(msg)
+        return packed
+
+
+class CompactEncoder:
+    """
+    Per-connection keyframe/delta bookkeeping for compact mode. A delta is
+    only sent when the client holds the immediately preceding frame for that
+    vehicle; dropped frames, new subscriptions and every KEYFRAME_INTERVAL-th
+    frame get a keyframe.
+    """
+
+    def __init__(self, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self._last_seq: Dict[str, int] = {}
+        self._since_key: Dict[str, int] = {}
+
+    def message(self, frame: TelemetryFrame, role: str) -> Union[bytes, str]:
+        vid = frame.vehicle_id
+        since_key = self._since_key.get(vid, 0)
+        keyframe = (
+            frame.prev is None
+            or self._last_seq.get(vid) != frame.seq - 1
+            or since_key >= self.keyframe_interval
+        )
+        self._last_seq[vid] = frame.seq
+        self._since_key[vid] = 0 if keyframe else since_key + 1
+        return frame.compact(role, keyframe)
+
+    def encode_batch(self, frames: List[TelemetryFrame], role: str) -> Union[bytes, str]:
+        return _pack_array([self.message(f, role) for f in frames])
+
+    def forget(self, vehicle_id: str) -> None:
+        self._last_seq.pop(vehicle_id, None)
+        self._since_key.pop(vehicle_id, None)
+
+
+class Subscription:
+    """
+    A viewer's bounded frame queue. When the viewer falls behind, `policy`
+    decides what gives: DROP_OLDEST evicts the oldest queued frame,
+    KEEP_LATEST keeps only the newest one, and DISCONNECT drops frames until
+    `max_missed` have been lost in a row (without the viewer draining its
+    queue in between), after which get() returns None and the connection
+    should be closed. `dropped` is the lifetime total, for stats.
+    """
+
+    def __init__(self, vehicle_id: str, role: str, maxsize: int, policy: str = DROP_OLDEST, max_missed: int = 50):
+        self.vehicle_id = vehicle_id
+        self.role = role
+        self.policy = policy
+        self.max_missed = max_missed
+        self.queue: "asyncio.Queue[Optional[TelemetryFrame]]" = asyncio.Queue(1 if policy == KEEP_LATEST else maxsize)
+        self.dropped = 0
+        # Drops since the viewer last caught up; what DISCONNECT acts on
+        self.missed = 0
+        self.overflowed = False
+        # Requested update period; None means every tick
+        self.cadence: Optional[float] = None
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def offer(self, frame: TelemetryFrame) -> None:
+        if self.overflowed:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.missed += 1
+            if self.policy == DISCONNECT and self.missed >= self.max_missed:
+                self.overflowed = True
+                # Wake the sender so it can close the connection
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.queue.put_nowait(None)
+                return
+        self.queue.put_nowait(frame)
+
+    async def get(self) -> Optional[TelemetryFrame]:
+        frame = await self.queue.get()
+        if self.queue.empty():
+            self.missed = 0
+        return frame
+
+
+class FleetSubscription:
+    """
+    One connection watching many vehicles. Frames are coalesced to the latest
+    per vehicle and drained as a single batch when the hub closes a tick, so
+    memory is bounded by the number of watched vehicles.
+
+    Coalescing already keeps only the latest frame per vehicle, so DROP_OLDEST
+    and KEEP_LATEST behave the same here; with DISCONNECT, a tick that ends
+    while the previous batch is still unsent counts as missed, and after
+    `max_missed` consecutive misses next_batch() returns None. Draining a
+    batch resets the count.
+    """
+
+    def __init__(self, role: str, policy: str = DROP_OLDEST, max_missed: int = 50):
+        self.role = role
+        self.policy = policy
+        self.max_missed = max_missed
+        self.vehicle_ids: Set[str] = set()
+        self.dropped = 0
+        self.missed_ticks = 0
+        self.overflowed = False
+        self._pending: Dict[str, TelemetryFrame] = {}
+        self._ready = asyncio.Event()
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def offer(self, frame: TelemetryFrame) -> None:
+        if self.overflowed:
+            return
+        if frame.vehicle_id in self._pending:
+            self.dropped += 1
+        self._pending[frame.vehicle_id] = frame
+
+    def end_tick(self) -> None:
+        if not self._pending:
+            return
+        if self._ready.is_set():
+            self.missed_ticks += 1
+            if self.policy == DISCONNECT and self.missed_ticks >= self.max_missed:
+                self.overflowed = True
+                self._pending.clear()
+        self._ready.set()
+
+    async def next_batch(self) -> Optional[List[TelemetryFrame]]:
+        """Wait for the end of a tick that changed at least one watched vehicle, then drain."""
+        await self._ready.wait()
+        self._ready.clear()
+        if self.overflowed:
+            return None
+        self.missed_ticks = 0
+        batch, self._pending = self._pending, {}
+        return list(batch.values())
+
+    def encode_batch(self, frames: List[TelemetryFrame]) -> str:
+        # Each vehicle frame is JSON-encoded once per role and shared across connections
+        body = ",".join(f.text_for(self.role) for f in frames)
+        return f'{{"type": "batch", "count": {len(frames)}, "vehicles": [{body}]}}'
+
+
+class TelemetryHub:
+    """
+    Runs the generate -> score -> alert -> UEBA pipeline for every watched
+    vehicle and fans each result out to that vehicle's subscribers.
+
+    A single timer drives all vehicles: every `interval` seconds the vehicles
+    whose cadence is due are handed to `process_batch` together, published,
+    and fleet subscriptions are flushed once. When a tick overruns, missed
+    ticks are skipped (coalesced) rather than queued, and counted.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+        interval: float = 3.0,
+        queue_size: int = 8,
+        policy: str = DROP_OLDEST,
+        max_missed: int = 50,
+    ):
+        self.process_batch = process_batch
+        self.interval = interval
+        self.queue_size = queue_size
+        self.policy = policy
+        self.max_missed = max_missed
+        self._subscribers: Dict[str, Set[Union[Subscription, FleetSubscription]]] = {}
+        self._last_frame: Dict[str, TelemetryFrame] = {}
+        self._cadence: Dict[str, float] = {}
+        self._next_due: Dict[str, float] = {}
+        self._touched_fleets: Set[FleetSubscription] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped_ticks = 0
+        self.last_tick_ms = 0.0
+        self.max_tick_ms = 0.0
+        self.last_batch_size = 0
+        # Totals from connections that have already gone away
+        self.closed_dropped = 0
+        self.slow_disconnects = 0
+
+    def subscribe(self, vehicle_id: str, role: str = "user", policy: Optional[str] = None) -> Subscription:
+        sub = Subscription(vehicle_id, role, self.queue_size, policy or self.policy, self.max_missed)
+        self.attach(vehicle_id, sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self.detach(sub.vehicle_id, sub)
+        self._closed(sub)
+
+    def fleet_subscription(self, role: str, policy: Optional[str] = None) -> FleetSubscription:
+        return FleetSubscription(role, policy or self.policy, self.max_missed)
+
+    def attach(self, vehicle_id: str, sub: Union[Subscription, FleetSubscription]) -> None:
+        self._subscribers.setdefault(vehicle_id, set()).add(sub)
+        last = self._last_frame.get(vehicle_id)
+        if last is not None:
+            sub.offer(last)
+        if vehicle_id not in self._next_due:
+            # Due on the next tick
+            self._next_due[vehicle_id] = 0.0
+        self._refresh_cadence(vehicle_id)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def detach(self, vehicle_id: str, sub: Union[Subscription, FleetSubscription]) -> None:
+        subs = self._subscribers.get(vehicle_id)
+        if not subs:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subscribers[vehicle_id]
+            self._last_frame.pop(vehicle_id, None)
+            self._next_due.pop(vehicle_id, None)
+            self._cadence.pop(vehicle_id, None)
+        else:
+            self._refresh_cadence(vehicle_id)
+
+    def watched(self, vehicle_id: str) -> bool:
+        """True while the vehicle has at least one subscriber."""
+        return vehicle_id in self._subscribers
+
+    def check_cadence(self, seconds: float) -> float:
+        """Raises ValueError unless `seconds` is a finite period between one tick and MAX_CADENCE_S."""
+        if not math.isfinite(seconds) or not self.interval <= seconds <= MAX_CADENCE_S:
+            raise ValueError(f"cadence must be between {self.interval:g} and {MAX_CADENCE_S:g} seconds")
+        return seconds
+
+    def set_cadence(self, sub: Subscription, seconds: float) -> None:
+        """
+        Update period for one viewer; rounded up to whole ticks by the scheduler.
+        A vehicle runs at the fastest cadence any of its current viewers wants,
+        so a slow viewer never throttles the others.
+        """
+        sub.cadence = self.check_cadence(seconds)
+        self._refresh_cadence(sub.vehicle_id)
+
+    def _refresh_cadence(self, vehicle_id: str) -> None:
+        subs = self._subscribers.get(vehicle_id)
+        if not subs:
+            return
+        # Fleet subscriptions have no cadence of their own and want every tick
+        step = min(getattr(s, "cadence", None) or self.interval for s in subs)
+        previous = self._cadence.get(vehicle_id, self.interval)
+        if step > self.interval:
+            self._cadence[vehicle_id] = step
+        else:
+            self._cadence.pop(vehicle_id, None)
+        if step < previous and vehicle_id in self._next_due:
+            # A faster viewer arrived; don't make it wait out the slower period
+            self._next_due[vehicle_id] = 0.0
+
+    def subscribe_fleet(self, sub: FleetSubscription, vehicle_ids: List[str]) -> None:
+        for vid in vehicle_ids:
+            if vid not in sub.vehicle_ids:
+                sub.vehicle_ids.add(vid)
+                self.attach(vid, sub)
+        # Last known frames go out as one batch, not one "tick" per vehicle
+        sub.end_tick()
+
+    def unsubscribe_fleet(self, sub: FleetSubscription, vehicle_ids: Optional[List[str]] = None) -> None:
+        for vid in list(sub.vehicle_ids if vehicle_ids is None else vehicle_ids):
+            if vid in sub.vehicle_ids:
+                sub.vehicle_ids.discard(vid)
+                self.detach(vid, sub)
+
+    def close_fleet(self, sub: FleetSubscription) -> None:
+        self.unsubscribe_fleet(sub)
+        self._closed(sub)
+
+    def _closed(self, sub: Union[Subscription, FleetSubscription]) -> None:
+        self.closed_dropped += sub.dropped
+        if sub.overflowed:
+            self.slow_disconnects += 1
+
+    def publish(self, vehicle_id: str, payload: Dict[str, Any]) -> Optional[TelemetryFrame]:
+        """Fan a processed payload out to the vehicle's subscribers."""
+        subs = self._subscribers.get(vehicle_id)
+        if not subs:
+            return None
+        last = self._last_frame.get(vehicle_id)
+        frame = TelemetryFrame(vehicle_id, payload, last.seq + 1 if last else 1, last)
+        if last is not None:
+            last.prev = None
+        self._last_frame[vehicle_id] = frame
+        for sub in subs:
+            sub.offer(frame)
+            if isinstance(sub, FleetSubscription):
+                self._touched_fleets.add(sub)
+        return frame
+
+    def flush(self) -> None:
+        """Release one batch to every fleet subscription that received frames since the last flush."""
+        for sub in self._touched_fleets:
+            sub.end_tick()
+        self._touched_fleets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        subs = {s for group in self._subscribers.values() for s in group}
+        depths = [s.depth for s in subs]
+        return {
+            "vehicles": len(self._subscribers),
+            "subscribers": len(subs),
+            "backpressure_policy": self.policy,
+            "dropped_frames": self.closed_dropped + sum(s.dropped for s in subs),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "slow_consumers": sum(1 for s in subs if s.dropped),
+            "slow_disconnects": self.slow_disconnects,
+            "tick_interval_s": self.interval,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "skipped_ticks": self.skipped_ticks,
+            "last_tick_ms": self.last_tick_ms,
+            "max_tick_ms": self.max_tick_ms,
+            "last_batch_size": self.last_batch_size,
+        }
+
+    def _tick(self, now: float) -> None:
+        due = [vid for vid, at in self._next_due.items() if at <= now]
+        self.last_batch_size = len(due)
+        if due:
+            try:
+                payloads = self.process_batch(due)
+            except Exception as e:
+                print(f"[TelemetryHub] batch of {len(due)} failed: {e}")
+                payloads = {}
+            for vid in due:
+                payload = payloads.get(vid)
+                if payload is not None:
+                    self.publish(vid, payload)
+                if vid in self._next_due:
+                    # Next slot on the tick grid; missed slots are not replayed
+                    step = self._cadence.get(vid, self.interval)
+                    self._next_due[vid] = max(self._next_due[vid] + step, now + step - self.interval / 2)
+        self.flush()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while self._subscribers:
+            started = loop.time()
+            self._tick(started)
+            finished = loop.time()
+            self.ticks += 1
+            self.last_tick_ms = round((finished - started) * 1000, 2)
+            self.max_tick_ms = max(self.max_tick_ms, self.last_tick_ms)
+
+            next_tick += self.interval
+            if finished > next_tick:
+                # Behind schedule: coalesce instead of running back-to-back catch-up ticks
+                missed = int((finished - next_tick) // self.interval) + 1
+                self.overruns += 1
+                self.skipped_ticks += missed
+                next_tick += missed * self.interval
+            await asyncio.sleep(next_tick - finished)
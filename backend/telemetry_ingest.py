@@ -0,0 +1,139 @@
+import json
+import math
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from predictive import SENSOR_NAMES
+
+MAX_BATCH_SAMPLES = 10000
+NDJSON_CHUNK_SAMPLES = 1000
+MAX_REPORTED_ERRORS = 100
+# One NDJSON sample; longer lines are rejected instead of buffered
+MAX_NDJSON_LINE_BYTES = 64 * 1024
+# vehicles.chassis_number / telemetry_stream.vehicle_id are String(50)
+MAX_VEHICLE_ID_LENGTH = 50
+# Accepted (min, max) for the telemetry_stream columns: Numeric(9,6) lat/lon, Numeric(5,2) speed
+_COLUMN_RANGES = {"latitude": (-90.0, 90.0), "longitude": (-180.0, 180.0), "speed_kmh": (0.0, 999.99)}
+
+_SENSORS = frozenset(SENSOR_NAMES)
+
+
+def _bad_number(value: Any, nested: bool = False) -> bool:
+    if isinstance(value, bool):
+        return nested
+    if isinstance(value, (int, float)):
+        return not math.isfinite(value)
+    if isinstance(value, dict) and not nested and "sensor_1" in value:
+        return _bad_number(value["sensor_1"], True) or _bad_number(value.get("sensor_2", 0), True)
+    return True
+
+
+def normalize_timestamp(value: Any) -> Optional[str]:
+    """ISO-8601 string or epoch seconds/milliseconds -> naive UTC ISO string (the stored form); None if unparseable."""
+    try:
+        if isinstance(value, str):
+            ts = datetime.fromisoformat(value)
+            if ts.tzinfo is not None:
+                ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+            seconds = value / 1000 if abs(value) > 1e11 else value
+            ts = datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+        else:
+            return None
+    except (ValueError, OverflowError, OSError):
+        return None
+    return ts.isoformat()
+
+
+def validate_sample(sample: Any) -> Optional[str]:
+    """
+    Cheap structural check; returns an error string or None if the sample is
+    usable. A valid `timestamp` is rewritten in place to naive UTC ISO form.
+    """
+    if not isinstance(sample, dict):
+        return "sample must be a JSON object"
+    vid = sample.get("vehicle_id") or sample.get("chassis_number")
+    if not isinstance(vid, str) or not vid:
+        return "vehicle_id (or chassis_number) is required"
+    if len(vid) > MAX_VEHICLE_ID_LENGTH:
+        return f"vehicle_id must be at most {MAX_VEHICLE_ID_LENGTH} characters"
+    if sample.get("timestamp") is not None:
+        ts = normalize_timestamp(sample["timestamp"])
+        if ts is None:
+            return "timestamp must be ISO-8601 or epoch seconds"
+        sample["timestamp"] = ts
+    for key, (low, high) in _COLUMN_RANGES.items():
+        value = sample.get(key)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+            return f"{key} must be a number between {low:g} and {high:g}"
+    for key in _SENSORS.intersection(sample):
+        if _bad_number(sample[key]):
+            return f"{key} must be a finite number or redundant sensor pair"
+    return None
+
+
+def split_valid(samples: List[Any], indexes: Optional[List[int]] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Partition samples into (valid, errors); `indexes` maps positions back to the request."""
+    valid, errors = [], []
+    for i, sample in enumerate(samples):
+        err = validate_sample(sample)
+        if err is None:
+            sample["vehicle_id"] = sample.get("vehicle_id") or sample["chassis_number"]
+            valid.append(sample)
+        else:
+            errors.append({"index": indexes[i] if indexes else i, "error": err})
+    return valid, errors
+
+
+async def iter_ndjson_chunks(
+    stream: AsyncIterator[bytes], chunk_size: int = NDJSON_CHUNK_SAMPLES, max_line: int = MAX_NDJSON_LINE_BYTES
+) -> AsyncIterator[Tuple[List[Any], List[int], List[Dict[str, Any]]]]:
+    """
+    Parse an NDJSON byte stream incrementally, yielding (samples, line_indexes,
+    parse_errors) every `chunk_size` samples so memory stays bounded
+    regardless of body size. Lines over `max_line` bytes are reported and
+    skipped without being buffered whole.
+    """
+    buf = b""
+    line_no = 0
+    skipping = False
+    samples: List[Any] = []
+    indexes: List[int] = []
+    errors: List[Dict[str, Any]] = []
+
+    def _take(line: bytes, index: int) -> None:
+        if len(line) > max_line:
+            errors.append({"index": index, "error": f"line longer than {max_line} bytes"})
+            return
+        if not line.strip():
+            return
+        try:
+            samples.append(json.loads(line))
+            indexes.append(index)
+        except ValueError:
+            errors.append({"index": index, "error": "invalid JSON line"})
+
+    async for chunk in stream:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if skipping:
+                # Tail of an over-long line already reported
+                skipping = False
+            else:
+                _take(line, line_no)
+            line_no += 1
+            if len(samples) >= chunk_size:
+                yield samples, indexes, errors
+                samples, indexes, errors = [], [], []
+        if len(buf) > max_line and not skipping:
+            errors.append({"index": line_no, "error": f"line longer than {max_line} bytes"})
+            skipping = True
+        if skipping:
+            buf = b""
+    if not skipping:
+        _take(buf, line_no)
+    if samples or errors:
+        yield samples, indexes, errors
@@ -0,0 +1,223 @@
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from database import engine
+from history_store import _numeric
+
+# Simulator / device cadence of raw rows, used to estimate point counts
+RAW_INTERVAL_S = 3
+# Finest first; query_history picks the first one that fits max_points
+RESOLUTIONS: Tuple[Tuple[str, int], ...] = (("raw", RAW_INTERVAL_S), ("1m", 60), ("1h", 3600))
+ROLLUP_TABLES = {"1m": "telemetry_rollup_1m", "1h": "telemetry_rollup_1h"}
+PARTITION_PREFIX = "telemetry_stream_p"
+# Catch-all partition for rows outside any daily partition; pruned by DELETE
+DEFAULT_PARTITION = "telemetry_stream_default"
+
+TELEMETRY_RETENTION_DAYS = int(os.getenv("TELEMETRY_RETENTION_DAYS", "30"))
+ROLLUP_1M_RETENTION_DAYS = int(os.getenv("ROLLUP_1M_RETENTION_DAYS", "90"))
+PARTITION_DAYS_AHEAD = int(os.getenv("TELEMETRY_PARTITION_DAYS_AHEAD", "3"))
+
+
+# --- PARTITIONS & RETENTION ---
+def partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def partition_ddl(days_ahead: int = PARTITION_DAYS_AHEAD, today: Optional[date] = None) -> List[str]:
+    """CREATE statements for daily partitions from today through `days_ahead` days out."""
+    today = today or datetime.utcnow().date()
+    stmts = []
+    for i in range(days_ahead + 1):
+        day = today + timedelta(days=i)
+        stmts.append(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF telemetry_stream "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        )
+    return stmts
+
+
+def ensure_partitions(days_ahead: int = PARTITION_DAYS_AHEAD) -> List[str]:
+    created = []
+    for stmt in partition_ddl(days_ahead):
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(stmt))
+            created.append(stmt.split()[5])
+        except Exception as e:
+            # e.g. rows for that day already landed in the default partition
+            print(f"[TelemetryStorage] partition create failed: {e}")
+    return created
+
+
+def drop_expired_partitions(
+    retention_days: int = TELEMETRY_RETENTION_DAYS,
+    rollup_1m_retention_days: int = ROLLUP_1M_RETENTION_DAYS,
+) -> List[str]:
+    """
+    Drop whole daily partitions past retention (no row-by-row DELETE), delete
+    expired rows that landed in the default partition, and prune old 1m rollups.
+    """
+    cutoff = datetime.utcnow().date() - timedelta(days=retention_days)
+    dropped = []
+    with engine.begin() as conn:
+        names = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'telemetry_stream'"
+        )).scalars().all()
+        for name in names:
+            if not name.startswith(PARTITION_PREFIX):
+                continue
+            try:
+                day = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+            except ValueError:
+                continue
+            if day < cutoff:
+                conn.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+                dropped.append(name)
+        if DEFAULT_PARTITION in names:
+            # Late or far-future rows end up here and would otherwise never expire
+            conn.execute(
+                text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"),
+                {"cutoff": datetime.combine(cutoff, datetime.min.time())},
+            )
+        conn.execute(
+            text("DELETE FROM telemetry_rollup_1m WHERE bucket < :cutoff"),
+            {"cutoff": datetime.utcnow() - timedelta(days=rollup_1m_retention_days)},
+        )
+    return dropped
+
+
+async def maintenance_loop(interval_s: float = 3600.0) -> None:
+    """Create upcoming partitions and enforce retention, off the event loop."""
+    while True:
+        try:
+            await asyncio.to_thread(ensure_partitions)
+            await asyncio.to_thread(drop_expired_partitions)
+        except Exception as e:
+            print(f"[TelemetryStorage] maintenance failed: {e}")
+        await asyncio.sleep(interval_s)
+
+
+# --- ROLLUPS ---
+def _as_datetime(ts: Any) -> datetime:
+    return datetime.fromisoformat(ts) if isinstance(ts, str) else ts
+
+
+def rollup_rows(rows: Sequence[tuple]) -> Dict[str, Dict[Tuple[str, str, datetime], List[float]]]:
+    """Aggregate writer rows into {resolution: {(vehicle, sensor, bucket): [min, max, sum, count]}}."""
+    out: Dict[str, Dict[Tuple[str, str, datetime], List[float]]] = {"1m": {}, "1h": {}}
+    for vid, ts, _, _, _, data in rows:
+        ts = _as_datetime(ts)
+        minute = ts.replace(second=0, microsecond=0)
+        buckets = (("1m", minute), ("1h", minute.replace(minute=0)))
+        for sensor, value in data.items():
+            num = _numeric(value)
+            if num is None or num != num:
+                continue
+            for res, bucket in buckets:
+                agg = out[res].get((vid, sensor, bucket))
+                if agg is None:
+                    out[res][(vid, sensor, bucket)] = [num, num, num, 1]
+                else:
+                    if num < agg[0]: agg[0] = num
+                    if num > agg[1]: agg[1] = num
+                    agg[2] += num
+                    agg[3] += 1
+    return out
+
+
+def upsert_rollups(cursor, rows: Sequence[tuple]) -> None:
+    """Merge one batch into the 1m/1h rollup tables inside the caller's transaction (psycopg2 cursor)."""
+    from psycopg2.extras import execute_values
+
+    for res, aggs in rollup_rows(rows).items():
+        if not aggs:
+            continue
+        table = ROLLUP_TABLES[res]
+        execute_values(
+            cursor,
+            f"INSERT INTO {table} AS t (vehicle_id, sensor, bucket, min_val, max_val, sum_val, count_val) VALUES %s "
+            "ON CONFLICT (vehicle_id, sensor, bucket) DO UPDATE SET "
+            "min_val = LEAST(t.min_val, EXCLUDED.min_val), "
+            "max_val = GREATEST(t.max_val, EXCLUDED.max_val), "
+            "sum_val = t.sum_val + EXCLUDED.sum_val, "
+            "count_val = t.count_val + EXCLUDED.count_val",
+            [(vid, sensor, bucket, *agg) for (vid, sensor, bucket), agg in aggs.items()],
+            page_size=1000,
+        )
+
+
+# --- QUERIES ---
+def pick_resolution(
+    start: datetime, end: datetime, max_points: int, resolutions: Sequence[Tuple[str, int]] = RESOLUTIONS
+) -> str:
+    """Finest of `resolutions` whose point count for the range fits in max_points (falls back to the coarsest)."""
+    span = max((end - start).total_seconds(), 0)
+    for name, step in resolutions:
+        if span / step <= max_points:
+            return name
+    return resolutions[-1][0]
+
+
+def query_history(
+    vehicle_id: str,
+    start: datetime,
+    end: datetime,
+    fields: Optional[Sequence[str]] = None,
+    max_points: int = 1000,
+    resolution: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Points for the range at `resolution`, or the finest one that fits
+    max_points. If an auto-picked raw query holds more rows than the nominal
+    cadence predicted it is retried at the finest rollup that fits; otherwise the
+    newest max_points points are returned with `truncated` set.
+    """
+    auto = resolution is None
+    resolution = resolution or pick_resolution(start, end, max_points)
+    # One extra row tells us whether the range held more than max_points
+    params = {"vid": vehicle_id, "start": start, "end": end, "limit": max_points + 1}
+    with engine.connect() as conn:
+        if resolution == "raw":
+            rows = conn.execute(text(
+                "SELECT timestamp, sensor_data FROM telemetry_stream "
+                "WHERE vehicle_id = :vid AND timestamp >= :start AND timestamp < :end "
+                "ORDER BY timestamp DESC LIMIT :limit"
+            ), params).all()
+            truncated = len(rows) > max_points
+            if not (truncated and auto):
+                points = []
+                for ts, data in reversed(rows[:max_points]):
+                    data = data or {}
+                    keys = fields if fields is not None else [k for k in data if _numeric(data[k]) is not None]
+                    points.append({"timestamp": ts.isoformat(), **{k: data.get(k) for k in keys}})
+                return {"vehicle_id": vehicle_id, "resolution": "raw", "truncated": truncated, "points": points}
+            # Raw is denser than its nominal cadence here; pick again among the rollups
+            resolution = pick_resolution(start, end, max_points, RESOLUTIONS[1:])
+
+        sensor_filter = ""
+        if fields is not None:
+            sensor_filter = "AND sensor = ANY(:sensors) "
+            params["sensors"] = list(fields)
+        # Newest buckets first so a limit keeps the end of the range, like raw mode
+        rows = conn.execute(text(
+            f"SELECT bucket, sensor, min_val, max_val, sum_val / count_val AS avg_val FROM {ROLLUP_TABLES[resolution]} "
+            f"WHERE vehicle_id = :vid AND bucket >= :start AND bucket < :end {sensor_filter}"
+            "AND bucket IN ("
+            f"SELECT DISTINCT bucket FROM {ROLLUP_TABLES[resolution]} "
+            f"WHERE vehicle_id = :vid AND bucket >= :start AND bucket < :end {sensor_filter}"
+            "ORDER BY bucket DESC LIMIT :limit) "
+            "ORDER BY bucket"
+        ), params).all()
+    by_bucket: Dict[datetime, Dict[str, Any]] = {}
+    for bucket, sensor, mn, mx, avg in rows:
+        point = by_bucket.setdefault(bucket, {"timestamp": bucket.isoformat()})
+        point[sensor] = {"min": mn, "max": mx, "avg": avg}
+    points = list(by_bucket.values())
+    truncated = len(points) > max_points
+    return {"vehicle_id": vehicle_id, "resolution": resolution, "truncated": truncated, "points": points[-max_points:]}
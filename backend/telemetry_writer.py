@@ -0,0 +1,216 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import exc as sa_exc
+
+from database import TelemetryStream, engine, session_scope
+from telemetry_storage import upsert_rollups
+
+# (vehicle_id, timestamp, latitude, longitude, speed_kmh, sensor_data)
+TelemetryRow = Tuple[str, Any, Optional[float], Optional[float], Optional[float], Dict[str, Any]]
+
+_COPY_SQL = (
+    "COPY telemetry_stream (vehicle_id, timestamp, latitude, longitude, speed_kmh, sensor_data) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+
+
+# Already stored in their own columns
+_ROW_KEYS = frozenset(("vehicle_id", "timestamp", "latitude", "longitude", "speed_kmh"))
+
+
+def is_transient_error(e: BaseException) -> bool:
+    """Database unavailable / timed out, as opposed to a batch containing a row it rejects."""
+    if isinstance(e, (sa_exc.OperationalError, sa_exc.InterfaceError, sa_exc.TimeoutError, ConnectionError)):
+        return True
+    # Raw DBAPI connections (COPY path) raise the driver's own classes
+    return any(cls.__name__ in ("OperationalError", "InterfaceError") for cls in type(e).__mro__)
+
+
+def _csv_field(value: Any) -> Any:
+    return "" if value is None else value
+
+
+def _sensor_json(data: Dict[str, Any]) -> str:
+    return json.dumps({k: v for k, v in data.items() if k not in _ROW_KEYS}, default=str)
+
+
+def copy_telemetry_rows(rows: List[TelemetryRow]) -> None:
+    """
+    Persist rows with a single COPY on Postgres (plus 1m/1h rollup upserts),
+    or one executemany INSERT elsewhere.
+    """
+    if engine.dialect.name == "postgresql":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for vid, ts, lat, lon, speed, data in rows:
+            writer.writerow((vid, ts, _csv_field(lat), _csv_field(lon), _csv_field(speed), _sensor_json(data)))
+        buf.seek(0)
+        conn = engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.copy_expert(_COPY_SQL, buf)
+                # Rollups are maintained in the same transaction as the raw rows
+                upsert_rollups(cur, rows)
+            conn.commit()
+        finally:
+            conn.close()
+        return
+    with session_scope() as session:
+        session.execute(
+            TelemetryStream.__table__.insert(),
+            [
+                {
+                    "vehicle_id": vid,
+                    "timestamp": datetime.fromisoformat(ts) if isinstance(ts, str) else ts,
+                    "latitude": lat,
+                    "longitude": lon,
+                    "speed_kmh": speed,
+                    "sensor_data": json.loads(_sensor_json(data)),
+                }
+                for vid, ts, lat, lon, speed, data in rows
+            ],
+        )
+
+
+class TelemetryWriter:
+    """
+    Background, batched writer for telemetry_stream.
+
+    enqueue() is O(1) and never blocks the tick loop. A single flush runs at a
+    time in a worker thread, triggered when `batch_rows` are buffered or every
+    `flush_seconds`. While the database is slow the buffer grows up to
+    `max_buffer` rows, after which the oldest rows are dropped and counted.
+
+    Connection-level failures put the batch back for a retry with backoff.
+    Any other failure means some row is unwritable (bad timestamp, value out
+    of column range, ...): the batch is bisected so the good rows still
+    commit, and the offending rows are dropped and counted as `rejected`.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[TelemetryRow]], None] = copy_telemetry_rows,
+        batch_rows: int = 1000,
+        flush_seconds: float = 2.0,
+        max_buffer: int = 100000,
+    ):
+        self.flush = flush
+        self.batch_rows = batch_rows
+        self.flush_seconds = flush_seconds
+        self._buffer: Deque[TelemetryRow] = deque(maxlen=max_buffer)
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failures = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "TelemetryWriter":
+        return cls(
+            batch_rows=int(os.getenv("TELEMETRY_FLUSH_ROWS", "1000")),
+            flush_seconds=float(os.getenv("TELEMETRY_FLUSH_SECONDS", "2.0")),
+            max_buffer=int(os.getenv("TELEMETRY_BUFFER_MAX", "100000")),
+        )
+
+    def enqueue(self, vehicle_id: str, timestamp: Any, sensor_data: Dict[str, Any],
+                latitude: Optional[float] = None, longitude: Optional[float] = None, speed_kmh: Optional[float] = None) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1  # deque(maxlen) evicts the oldest row
+        self._buffer.append((vehicle_id, timestamp, latitude, longitude, speed_kmh, sensor_data))
+        if len(self._buffer) >= self.batch_rows:
+            self._wake.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background loop and flush whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._buffer:
+            if not await self._flush_once():
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "max_buffer": self._buffer.maxlen,
+            "written": self.written,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "last_flush_ms": self.last_flush_ms,
+            "last_error": self.last_error,
+        }
+
+    async def _run(self) -> None:
+        backoff = self.flush_seconds
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            ok = True
+            while ok and self._buffer:
+                ok = await self._flush_once()
+                if len(self._buffer) < self.batch_rows:
+                    break
+            # Back off while the database is failing instead of hammering it
+            backoff = self.flush_seconds if ok else min(backoff * 2, 60.0)
+
+    def _requeue(self, rows: List[TelemetryRow]) -> None:
+        # Back in front of anything newer, as far as capacity allows
+        room = self._buffer.maxlen - len(self._buffer)
+        self.dropped += max(0, len(rows) - room)
+        self._buffer.extendleft(reversed(rows[:room]))
+
+    async def _flush_once(self) -> bool:
+        n = min(len(self._buffer), self.batch_rows)
+        rows = [self._buffer.popleft() for _ in range(n)]
+        started = time.perf_counter()
+        # Halves still to write; a data error splits a chunk until the bad row is alone
+        pending = [rows]
+        written = 0
+        while pending:
+            chunk = pending.pop()
+            try:
+                await asyncio.to_thread(self.flush, chunk)
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                if is_transient_error(e):
+                    self._requeue(chunk + [row for part in reversed(pending) for row in part])
+                    self.written += written
+                    return False
+                if len(chunk) == 1:
+                    self.rejected += 1
+                    print(f"[TelemetryWriter] dropped unwritable row for {chunk[0][0]!r}: {e}")
+                else:
+                    mid = len(chunk) // 2
+                    pending.extend((chunk[mid:], chunk[:mid]))
+                continue
+            written += len(chunk)
+        self.flushes += 1
+        self.written += written
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+        return True
@@ -0,0 +1,89 @@
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional
+
+# Booking statuses that still occupy a service bay / queue slot
+ACTIVE_STATUSES = frozenset(("OPEN", "IN_PROGRESS"))
+# Statuses that count as completed work (throughput); CANCELLED only leaves the queue
+DONE_STATUSES = frozenset(("COMPLETED", "CLOSED"))
+BOOKING_STATUSES = ACTIVE_STATUSES | DONE_STATUSES | {"CANCELLED"}
+
+
+class WaitTimeEstimator:
+    """
+    Queue-based wait time per service center, kept in memory and updated
+    incrementally on every booking / status change.
+
+    wait = open tickets / throughput. Bay capacity (`bays / service_minutes`)
+    is both the prior and the ceiling; the measured rate is completions over
+    the span they cover (oldest one in the last `window_hours` to now) and
+    is blended in with weight n / (n + min_samples), so the estimate moves
+    smoothly as completions accumulate. estimate() is a dict lookup.
+    """
+
+    def __init__(self, service_minutes: float = 45.0, bays: int = 2, window_hours: float = 24.0, min_samples: int = 5):
+        self.service_minutes = service_minutes
+        self.bays = bays
+        self.window_s = window_hours * 3600
+        self.min_samples = min_samples
+        self._open: Dict[str, int] = {}
+        self._done: Dict[str, Deque[float]] = {}
+        self._estimates: Dict[str, int] = {}
+
+    def load(self, open_counts: Dict[str, int], completions: Dict[str, Iterable[float]]) -> None:
+        """Replace state from the database (startup / periodic reconciliation)."""
+        self._open = {c: n for c, n in open_counts.items() if c}
+        self._done = {c: deque(sorted(ts)) for c, ts in completions.items() if c}
+        self._estimates = {}
+        for center_id in set(self._open) | set(self._done):
+            self._recompute(center_id)
+
+    def booking_opened(self, center_id: Optional[str]) -> None:
+        if not center_id:
+            return
+        self._open[center_id] = self._open.get(center_id, 0) + 1
+        self._recompute(center_id)
+
+    def status_changed(self, center_id: Optional[str], old: Optional[str], new: str, ts: Optional[float] = None) -> None:
+        if not center_id:
+            return
+        was_open, is_open = (old or "OPEN") in ACTIVE_STATUSES, new in ACTIVE_STATUSES
+        if was_open and not is_open:
+            self._open[center_id] = max(0, self._open.get(center_id, 0) - 1)
+        elif is_open and not was_open:
+            self._open[center_id] = self._open.get(center_id, 0) + 1
+        if new in DONE_STATUSES and old not in DONE_STATUSES:
+            self._done.setdefault(center_id, deque()).append(time.time() if ts is None else ts)
+        self._recompute(center_id)
+
+    def open_tickets(self, center_id: str) -> int:
+        return self._open.get(center_id, 0)
+
+    def estimate(self, center_id: str) -> int:
+        """Estimated wait in minutes for a new booking at this center."""
+        est = self._estimates.get(center_id)
+        return 0 if est is None else est
+
+    def minutes_per_ticket(self, center_id: str) -> float:
+        """Marginal wait one more queued ticket adds at this center."""
+        return 1.0 / self._per_minute(center_id)
+
+    def _per_minute(self, center_id: str) -> float:
+        capacity = self.bays / self.service_minutes
+        done = self._done.get(center_id)
+        if not done:
+            return capacity
+        now = time.time()
+        cutoff = now - self.window_s
+        while done and done[0] < cutoff:
+            done.popleft()
+        if not done:
+            return capacity
+        n = len(done)
+        span_minutes = max((now - done[0]) / 60, self.service_minutes)
+        measured = min(n / span_minutes, capacity)
+        weight = n / (n + self.min_samples)
+        return weight * measured + (1 - weight) * capacity
+
+    def _recompute(self, center_id: str) -> None:
+        self._estimates[center_id] = int(round(self._open.get(center_id, 0) / self._per_minute(center_id)))
@@ -3,14 +3,18 @@ import axios from 'axios'
 
 export default function ManagerBookings({ centerId, serviceCenters, styles, onCenterChange }) {
   const [bookings, setBookings] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [loading, setLoading] = useState(false)
+  const [loadingMore, setLoadingMore] = useState(false)
 
+  // The API returns one page (newest first) plus a cursor for the next one
   const fetchBookings = async (cid) => {
     if (!cid) return
     setLoading(true)
     try {
       const res = await axios.get(`http://localhost:8001/manager/bookings`, { params: { center_id: cid } })
       setBookings(res.data.bookings || [])
+      setNextCursor(res.data.next_cursor || null)
     } catch (e) {
       console.error("Failed to load bookings", e)
     } finally {
@@ -18,6 +22,20 @@ export default function ManagerBookings({ centerId, serviceCenters, styles, onCe
     }
   }
 
+  const fetchMore = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      const res = await axios.get(`http://localhost:8001/manager/bookings`, { params: { center_id: centerId, cursor: nextCursor } })
+      setBookings(prev => [...prev, ...(res.data.bookings || [])])
+      setNextCursor(res.data.next_cursor || null)
+    } catch (e) {
+      console.error("Failed to load more bookings", e)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   useEffect(() => {
     fetchBookings(centerId)
   }, [centerId])
@@ -58,6 +76,11 @@ export default function ManagerBookings({ centerId, serviceCenters, styles, onCe
           </tbody>
         </table>
       )}
+      {(!loading && nextCursor) && (
+        <button style={{...styles.btn, marginTop:'12px'}} onClick={fetchMore} disabled={loadingMore}>
+          {loadingMore ? 'Loading...' : 'Load more'}
+        </button>
+      )}
       {(!loading && bookings.length === 0) && <p style={{color:'#64748b'}}>No bookings yet for this center.</p>}
     </div>
   )